@@ -0,0 +1,109 @@
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from catalog import OUTPUT_COLUMNS, DISTANCE_COLUMN, METRICS
+from model import DATASET_PATH, TOP_N_RECOMMENDATIONS, COLOR_METRIC, get_dominant_skin_color_from_path
+from snapshot import load_catalog
+
+MANIFEST_COLUMNS = ['user_id', 'gender', 'image_path']
+OUTPUT_FIELDS = ['user_id', 'gender', 'rank'] + OUTPUT_COLUMNS + [DISTANCE_COLUMN]
+BLOCK_SIZE = 1024
+EXTRACTION_CHUNKSIZE = 16
+
+
+def read_manifest(manifest_path):
+    try:
+        manifest = pd.read_csv(manifest_path, dtype=str)
+    except FileNotFoundError:
+        print(f"Error: Manifest file not found at {manifest_path}")
+        return None
+    missing_cols = [col for col in MANIFEST_COLUMNS if col not in manifest.columns]
+    if missing_cols:
+        print(f"Error: Missing required columns in the manifest: {missing_cols}")
+        return None
+    manifest = manifest.dropna(subset=MANIFEST_COLUMNS)
+    manifest['gender'] = manifest['gender'].str.strip()
+    manifest['image_path'] = manifest['image_path'].str.strip()
+    return manifest.reset_index(drop=True)
+
+
+def extract_skin_colors(image_paths, workers=None):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(get_dominant_skin_color_from_path, image_paths, chunksize=EXTRACTION_CHUNKSIZE))
+
+
+def recommend_batch(manifest, catalog, top_n=TOP_N_RECOMMENDATIONS, workers=None, block_size=BLOCK_SIZE,
+                    metric=COLOR_METRIC):
+    print(f"Extracting skin colors for {len(manifest)} users...")
+    start = time.perf_counter()
+    skin_colors = extract_skin_colors(manifest['image_path'].tolist(), workers)
+    print(f"Skin extraction finished in {time.perf_counter() - start:.1f}s")
+
+    valid = np.array([color is not None for color in skin_colors], dtype=bool)
+    user_colors = np.zeros((len(manifest), 3), dtype=np.float64)
+    if valid.any():
+        user_colors[valid] = np.vstack([color for color in skin_colors if color is not None])
+    print(f"Skin color detected for {int(valid.sum())}/{len(manifest)} users.")
+
+    results = []
+    genders = manifest['gender'].str.lower()
+    for gender in genders[valid].unique():
+        users = np.flatnonzero(valid & (genders == gender).to_numpy())
+        if catalog.partition_size(gender) == 0:
+            print(f"Warning: No products for gender '{gender}', skipping {len(users)} users.")
+            continue
+        rows, distances = catalog.nearest_batch(user_colors[users], gender, top_n, block_size, metric)
+        results.append((users, rows, distances))
+    return results
+
+
+def write_recommendations(output_path, manifest, catalog, results):
+    tmp_path = output_path + '.tmp'
+    written = 0
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(OUTPUT_FIELDS)
+        for users, rows, distances in results:
+            flat_rows = rows.ravel()
+            columns = [catalog.columns[col].take(flat_rows).reshape(rows.shape) for col in OUTPUT_COLUMNS]
+            for i, user in enumerate(users):
+                user_id = manifest.at[user, 'user_id']
+                gender = manifest.at[user, 'gender']
+                for rank in range(rows.shape[1]):
+                    writer.writerow([user_id, gender, rank + 1]
+                                    + [column[i, rank] for column in columns]
+                                    + [f"{distances[i, rank]:.4f}"])
+                written += 1
+    os.replace(tmp_path, output_path)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline top-N recommendations for a manifest of user images.")
+    parser.add_argument('manifest', help="CSV with user_id, gender, image_path columns")
+    parser.add_argument('output', help="CSV to write one row per (user, rank)")
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--top-n', type=int, default=TOP_N_RECOMMENDATIONS)
+    parser.add_argument('--workers', type=int, default=None, help="skin extraction processes (default: CPU count)")
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE, help="users per distance block")
+    parser.add_argument('--metric', choices=METRICS, default=COLOR_METRIC, help="rgb distance or CIELAB delta E")
+    args = parser.parse_args()
+
+    manifest = read_manifest(args.manifest)
+    if manifest is None:
+        exit()
+    catalog = load_catalog(args.dataset)
+    if catalog is None:
+        exit()
+
+    start = time.perf_counter()
+    results = recommend_batch(manifest, catalog, args.top_n, args.workers, args.block_size, args.metric)
+    written = write_recommendations(args.output, manifest, catalog, results)
+    print(f"\nWrote recommendations for {written}/{len(manifest)} users to {args.output} "
+          f"in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,326 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from catalog import (CATEGORY_COLUMN, GENDER_COLUMN, MODEL_IMAGE_COLUMN, PRICE_COLUMN, PRODUCT_ID_COLUMN,
+                     SKIN_COLOR_COLUMN, URL_COLUMN, clean_dataset)
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+DEFAULT_OUTPUT = 'bench_results.json'
+SEED_DATASET_PATH = './data/final.csv'
+CSV_COLUMNS = ['product_id', 'product_name', 'category', 'price', 'product_url', 'description',
+               'front_image_url', 'model_image_url', 'additional_images', 'new_model_image_url',
+               'detected_skin_color_rgb', 'detected_gender_freq']
+GENERATE_CHUNK_ROWS = 500_000
+INVALID_FRACTION = 0.1
+NUM_USER_IMAGES = 50
+NUM_QUERIES = 500
+TOP_N = 5
+USER_IMAGE_SHAPE = (720, 540)
+
+# Used when the seed dataset is not available.
+FALLBACK_PROFILE = {
+    'genders': {'Women': 0.51, 'Men': 0.43, 'Boys': 0.025, 'Unisex': 0.02, 'Girls': 0.015},
+    'categories': {'Shirt': 0.25, 'Capris': 0.2, 'TShirt': 0.15, 'Jeans': 0.15, 'Pants': 0.15, 'Kurtas': 0.1},
+    'color_mean': [172.6, 136.6, 116.2],
+    'color_cov': [[679.8, 599.4, 496.5], [599.4, 600.7, 507.5], [496.5, 507.5, 468.9]],
+    'price_log_mean': 6.9,
+    'price_log_std': 0.5,
+}
+
+
+def seed_profile(path=SEED_DATASET_PATH):
+    # Gender/category mix, skin-color mean/covariance and price spread of the
+    # real catalog, so synthetic catalogs keep its shape at any size.
+    try:
+        df = clean_dataset(pd.read_csv(path))
+    except FileNotFoundError:
+        df = None
+    if df is None or len(df) < 10:
+        return FALLBACK_PROFILE
+    colors = np.vstack(df['numeric_skin_color'].to_numpy()).astype(np.float64)
+    prices = pd.to_numeric(df[PRICE_COLUMN].astype(str).str.extract(r'(\d+)', expand=False), errors='coerce')
+    prices = np.log(prices.dropna().clip(lower=1))
+    genders = df[GENDER_COLUMN][~df[GENDER_COLUMN].str.startswith('Error')]
+    return {
+        'genders': genders.value_counts(normalize=True).to_dict(),
+        'categories': df[CATEGORY_COLUMN].value_counts(normalize=True).to_dict(),
+        'color_mean': colors.mean(axis=0).tolist(),
+        'color_cov': np.cov(colors.T).tolist(),
+        'price_log_mean': float(prices.mean()),
+        'price_log_std': float(prices.std()),
+    }
+
+
+def _choice(rng, distribution, size):
+    labels = list(distribution)
+    weights = np.array([distribution[label] for label in labels], dtype=np.float64)
+    return np.array(labels, dtype=object)[rng.choice(len(labels), size=size, p=weights / weights.sum())]
+
+
+def synthetic_chunk(rng, start, rows, profile):
+    ids = np.arange(start, start + rows).astype(str)
+    colors = rng.multivariate_normal(profile['color_mean'], profile['color_cov'], size=rows)
+    colors = np.clip(np.rint(colors), 0, 255).astype(int)
+    color_strings = pd.Series(colors[:, 0].astype(str), dtype=object)
+    color_strings = '(' + color_strings + ', ' + colors[:, 1].astype(str) + ', ' + colors[:, 2].astype(str) + ')'
+    invalid = rng.random(rows) < INVALID_FRACTION
+    color_strings[invalid] = 'Invalid URL'
+
+    prices = np.exp(rng.normal(profile['price_log_mean'], profile['price_log_std'], size=rows)).astype(int)
+    mrp = rng.random(rows) < 0.13
+    price_strings = np.where(mrp, 'MRP₹ ', '₹').astype(object) + prices.astype(str)
+
+    image_urls = 'https://assets.example.com/h_720,q_90,w_540/v1/assets/images/' + pd.Series(ids, dtype=object) + '/model.jpg'
+    return pd.DataFrame({
+        PRODUCT_ID_COLUMN: 'product_' + pd.Series(ids, dtype=object),
+        'product_name': 'Brand',
+        CATEGORY_COLUMN: _choice(rng, profile['categories'], rows),
+        PRICE_COLUMN: price_strings,
+        URL_COLUMN: 'https://www.example.com/p/' + pd.Series(ids, dtype=object) + '/buy',
+        'description': 'Synthetic product',
+        'front_image_url': '',
+        'model_image_url': image_urls,
+        'additional_images': image_urls,
+        MODEL_IMAGE_COLUMN: image_urls,
+        SKIN_COLOR_COLUMN: color_strings,
+        GENDER_COLUMN: _choice(rng, profile['genders'], rows),
+    }, columns=CSV_COLUMNS)
+
+
+def generate_catalog(path, rows, profile, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for start in range(0, rows, GENERATE_CHUNK_ROWS):
+            chunk = synthetic_chunk(rng, start, min(GENERATE_CHUNK_ROWS, rows - start), profile)
+            chunk.to_csv(f, index=False, header=(start == 0))
+
+
+def generate_user_images(directory, count, profile, seed=0):
+    # A skin-colored face/arm region on a random garment/background, so the
+    # whole HSV masking + estimation path is exercised.
+    rng = np.random.default_rng(seed)
+    height, width = USER_IMAGE_SHAPE
+    paths = []
+    for i in range(count):
+        image = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        rgb = np.clip(rng.multivariate_normal(profile['color_mean'], profile['color_cov']), 0, 255)
+        skin = np.clip(rgb[::-1] + rng.normal(0, 6, size=(height // 3, width // 3, 3)), 0, 255).astype(np.uint8)
+        image[height // 6:height // 6 + skin.shape[0], width // 3:width // 3 + skin.shape[1]] = skin
+        path = os.path.join(directory, f'user_{i}.jpg')
+        cv2.imwrite(path, image)
+        paths.append(path)
+    return paths
+
+
+def _percentiles(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {'p50_ms': float(np.percentile(samples, 50)), 'p99_ms': float(np.percentile(samples, 99)),
+            'mean_ms': float(samples.mean())}
+
+
+def _peak_rss_mb():
+    # Peak resident set size of this process in MB, or None where it cannot be
+    # read. ru_maxrss is in KiB on Linux but in bytes on macOS; Windows has no
+    # resource module and reports the peak working set through psapi instead.
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        get_process_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_process_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+        if not get_process_memory_info(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters),
+                                       counters.cb):
+            return None
+        return counters.PeakWorkingSetSize / 1024 ** 2
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _format_mb(value):
+    return 'n/a' if value is None else f"{value:.0f} MB"
+
+
+def run_cold_start(csv_path):
+    from snapshot import load_catalog
+
+    start = time.perf_counter()
+    catalog = load_catalog(csv_path, rebuild=True)
+    return {'seconds': time.perf_counter() - start, 'products': len(catalog), 'peak_rss_mb': _peak_rss_mb()}
+
+
+def run_queries(csv_path, image_dir, num_queries, seed=0):
+    import model
+    from snapshot import load_catalog
+
+    start = time.perf_counter()
+    catalog = load_catalog(csv_path)
+    load_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    images = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir))
+    genders = catalog.genders
+    categories = catalog.categories
+    timings = {'skin': [], 'rank': [], 'rank_lab': [], 'rank_filtered': [], 'total': []}
+    for _ in range(num_queries):
+        image_path = images[rng.integers(len(images))]
+        gender = genders[rng.integers(len(genders))]
+        with open(image_path, 'rb') as f:
+            image_bytes = f.read()
+
+        t0 = time.perf_counter()
+        user_color = model.get_dominant_skin_color_from_bytes(image_bytes)
+        t1 = time.perf_counter()
+        if user_color is None:
+            continue
+        catalog.recommend(user_color, gender, TOP_N)
+        t2 = time.perf_counter()
+        catalog.recommend(user_color, gender, TOP_N, 'lab')
+        t3 = time.perf_counter()
+        catalog.recommend(user_color, gender, TOP_N, category=categories[rng.integers(len(categories))],
+                          min_price=500, max_price=1500)
+        t4 = time.perf_counter()
+
+        timings['skin'].append((t1 - t0) * 1000)
+        timings['rank'].append((t2 - t1) * 1000)
+        timings['rank_lab'].append((t3 - t2) * 1000)
+        timings['rank_filtered'].append((t4 - t3) * 1000)
+        timings['total'].append((t2 - t0) * 1000)
+
+    return {
+        'snapshot_load_seconds': load_seconds,
+        'queries': len(timings['total']),
+        'latency': {name: _percentiles(samples) for name, samples in timings.items() if samples},
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def _run_stage(stage, *args):
+    # Each stage runs in a fresh interpreter so cold start and peak RSS are
+    # measured per stage rather than accumulated across sizes.
+    with open(os.devnull, 'w') as devnull:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '_stage', stage, *map(str, args)],
+                                check=True, stdout=subprocess.PIPE, stderr=devnull, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmark(sizes, output_path, work_dir, num_queries=NUM_QUERIES, seed=0):
+    profile = seed_profile()
+    image_dir = os.path.join(work_dir, 'users')
+    os.makedirs(image_dir, exist_ok=True)
+    generate_user_images(image_dir, NUM_USER_IMAGES, profile, seed)
+
+    results = []
+    for rows in sizes:
+        csv_path = os.path.join(work_dir, f'catalog_{rows}.csv')
+        print(f"\n=== {rows:,} rows ===")
+        start = time.perf_counter()
+        generate_catalog(csv_path, rows, profile, seed)
+        print(f"Generated {csv_path} in {time.perf_counter() - start:.1f}s")
+
+        cold = _run_stage('cold', csv_path)
+        print(f"Cold start (CSV parse + clean + snapshot): {cold['seconds']:.2f}s, peak RSS {_format_mb(cold['peak_rss_mb'])}")
+        warm = _run_stage('queries', csv_path, image_dir, num_queries, seed)
+        latency = warm['latency']
+        print(f"Snapshot load: {warm['snapshot_load_seconds'] * 1000:.1f}ms, peak RSS {_format_mb(warm['peak_rss_mb'])}")
+        for name, stats in latency.items():
+            print(f"  {name:14s} p50 {stats['p50_ms']:8.3f}ms  p99 {stats['p99_ms']:8.3f}ms")
+        results.append({'rows': rows, 'products': cold['products'], 'cold_start': cold, 'warm': warm})
+
+    report = {
+        'meta': {
+            'git_revision': _git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'num_queries': num_queries,
+            'seed': seed,
+        },
+        'results': results,
+    }
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output_path}")
+    return report
+
+
+def compare_reports(baseline_path, current_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {r['rows']: r for r in json.load(f)['results']}
+    with open(current_path, 'r', encoding='utf-8') as f:
+        current = json.load(f)['results']
+    for result in current:
+        base = baseline.get(result['rows'])
+        if base is None:
+            continue
+        print(f"\n=== {result['rows']:,} rows (current / baseline) ===")
+        print(f"  cold start     {result['cold_start']['seconds'] / base['cold_start']['seconds']:6.2f}x")
+        if result['warm']['peak_rss_mb'] and base['warm']['peak_rss_mb']:
+            print(f"  peak RSS       {result['warm']['peak_rss_mb'] / base['warm']['peak_rss_mb']:6.2f}x")
+        for name, stats in result['warm']['latency'].items():
+            base_stats = base['warm']['latency'].get(name)
+            if base_stats:
+                print(f"  {name:14s} p50 {stats['p50_ms'] / base_stats['p50_ms']:6.2f}x  "
+                      f"p99 {stats['p99_ms'] / base_stats['p99_ms']:6.2f}x")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == '_stage':
+        stage, stage_args = sys.argv[2], sys.argv[3:]
+        if stage == 'cold':
+            result = run_cold_start(stage_args[0])
+        else:
+            result = run_queries(stage_args[0], stage_args[1], int(stage_args[2]), int(stage_args[3]))
+        print(json.dumps(result))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation path on synthetic catalogs.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--queries', type=int, default=NUM_QUERIES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=None, help="where synthetic catalogs/images go (default: temp dir)")
+    parser.add_argument('--compare', metavar='BASELINE_JSON', help="print ratios against an earlier results file")
+    args = parser.parse_args()
+
+    if args.work_dir:
+        os.makedirs(args.work_dir, exist_ok=True)
+        run_benchmark(args.sizes, args.output, args.work_dir, args.queries, args.seed)
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            run_benchmark(args.sizes, args.output, work_dir, args.queries, args.seed)
+    if args.compare:
+        compare_reports(args.compare, args.output)
@@ -0,0 +1,71 @@
+import os
+import threading
+
+# Eviction trims back to max_bytes only once a cache is this far over it, so
+# the directory scan does not run on every put.
+EVICTION_SLACK = 0.1
+
+
+def write_atomic(path, data, mode):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def sharded_entries(directory):
+    # Files under directory/<2-char shard>/, skipping unfinished .tmp writes.
+    for shard in os.scandir(directory):
+        if shard.is_dir():
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith('.tmp'):
+                    yield entry
+
+
+def evict_least_recent(groups, limit, size=lambda stat: stat.st_size):
+    # groups: {key: [DirEntry, ...]}, files that are kept or dropped together.
+    # Removes whole groups, least recently touched first, until the total of
+    # size(stat) is at most limit (bytes by default; size=lambda stat: 1
+    # bounds the number of files); returns the remaining total.
+    stats = {key: [entry.stat() for entry in entries] for key, entries in groups.items()}
+    sizes = {key: sum(size(stat) for stat in key_stats) for key, key_stats in stats.items()}
+    total = sum(sizes.values())
+    for key in sorted(stats, key=lambda k: max(stat.st_mtime for stat in stats[k])):
+        if total <= limit:
+            break
+        for entry in groups[key]:
+            remove_file(entry.path)
+        total -= sizes[key]
+    return total
+
+
+class SizeBoundedCache:
+    # Bookkeeping shared by the on-disk caches: named counters and the
+    # tracked total size, both under one lock.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _grow(self, delta):
+        # Adds delta bytes; True when the cache is due for evict().
+        with self._lock:
+            self._bytes += delta
+            return self._bytes > self.max_bytes * (1 + EVICTION_SLACK)
+
+    def _set_size(self, total):
+        with self._lock:
+            self._bytes = total
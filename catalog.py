@@ -0,0 +1,629 @@
+import json
+import numpy as np
+import pandas as pd
+import re
+
+from color_index import ColorIndex, rgb_to_lab
+
+PRODUCT_ID_COLUMN = 'product_id'
+GENDER_COLUMN = 'detected_gender_freq'
+SKIN_COLOR_COLUMN = 'detected_skin_color_rgb'
+MODEL_IMAGE_COLUMN = 'new_model_image_url'
+URL_COLUMN = 'product_url'
+PRICE_COLUMN = 'price'
+CATEGORY_COLUMN = 'category'
+NUMERIC_COLOR_COLUMN = 'numeric_skin_color'
+DISTANCE_COLUMN = 'color_distance'
+DELTA_OP_COLUMN = 'op'
+
+OUTPUT_COLUMNS = [PRODUCT_ID_COLUMN, MODEL_IMAGE_COLUMN, URL_COLUMN, PRICE_COLUMN]
+REQUIRED_COLUMNS = [MODEL_IMAGE_COLUMN, SKIN_COLOR_COLUMN, GENDER_COLUMN, URL_COLUMN, PRICE_COLUMN]
+
+INVALID_URL_INDICATORS = ["", "Not Processed", "Invalid URL", "Error"]
+INVALID_COLOR_INDICATORS = ["", "Not Detected", "Invalid URL", "Error", "Not Processed"]
+MISSING_PRICE = -1
+MISSING_CATEGORY = -1
+METRICS = ('rgb', 'lab')
+DEFAULT_METRIC = 'rgb'
+COMPACT_MIN_ROWS = 1024
+COMPACT_FRACTION = 0.1
+
+
+def parse_rgb_string(rgb_str):
+    if not isinstance(rgb_str, str):
+        return None
+    match = re.search(r'\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)', rgb_str)
+    if match:
+        try:
+            r, g, b = map(int, match.groups())
+            if 0 <= r <= 255 and 0 <= g <= 255 and 0 <= b <= 255:
+                return np.array([r, g, b])
+            else:
+                print(f"Warning: Parsed RGB values out of range: {(r,g,b)} from '{rgb_str}'")
+                return None
+        except ValueError:
+            print(f"Warning: Could not convert parsed values to int in '{rgb_str}'")
+            return None
+    else:
+        return None
+
+
+def parse_prices(price_series):
+    # "MRP₹ 1,299" / "₹607" -> 1299 / 607; anything without digits -> MISSING_PRICE
+    digits = price_series.astype(str).str.replace(',', '', regex=False).str.extract(r'(\d+)', expand=False)
+    return pd.to_numeric(digits, errors='coerce').fillna(MISSING_PRICE).astype(np.int32).to_numpy()
+
+
+def clean_dataset(df):
+    print("Cleaning data...")
+    initial_rows = len(df)
+
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_cols:
+        print(f"Error: Missing required columns in the dataset: {missing_cols}")
+        return None
+
+    df = df.dropna(subset=[MODEL_IMAGE_COLUMN])
+    df = df[~df[MODEL_IMAGE_COLUMN].astype(str).str.strip().isin(INVALID_URL_INDICATORS)]
+    print(f"Rows after removing invalid model URLs: {len(df)}")
+
+    df = df.dropna(subset=[SKIN_COLOR_COLUMN])
+    df = df[~df[SKIN_COLOR_COLUMN].astype(str).str.strip().isin(INVALID_COLOR_INDICATORS)].copy()
+    print(f"Rows after removing invalid skin colors: {len(df)}")
+
+    df[NUMERIC_COLOR_COLUMN] = df[SKIN_COLOR_COLUMN].apply(parse_rgb_string)
+
+    df.dropna(subset=[NUMERIC_COLOR_COLUMN], inplace=True)
+    print(f"Rows after parsing and removing failed skin colors: {len(df)}")
+
+    rows_removed = initial_rows - len(df)
+    print(f"Removed {rows_removed} rows during cleaning.")
+    return df
+
+
+def valid_product_mask(df):
+    # Row-wise version of clean_dataset for update batches: returns the mask of
+    # rows that would survive cleaning and their parsed colors.
+    colors = df[SKIN_COLOR_COLUMN].apply(parse_rgb_string) if SKIN_COLOR_COLUMN in df.columns \
+        else pd.Series(None, index=df.index, dtype=object)
+    valid = colors.notna()
+    if MODEL_IMAGE_COLUMN in df.columns:
+        valid &= df[MODEL_IMAGE_COLUMN].notna()
+        valid &= ~df[MODEL_IMAGE_COLUMN].astype(str).str.strip().isin(INVALID_URL_INDICATORS)
+    else:
+        valid[:] = False
+    valid &= df[GENDER_COLUMN].notna() if GENDER_COLUMN in df.columns else False
+    return valid.to_numpy(dtype=bool), colors
+
+
+def read_delta(path):
+    # Product updates as CSV or JSON lines in the final.csv schema. An optional
+    # 'op' column marks rows as 'upsert' (default) or 'delete'.
+    try:
+        if path.endswith('.jsonl') or path.endswith('.json'):
+            with open(path, 'r', encoding='utf-8') as f:
+                delta = pd.DataFrame([json.loads(line) for line in f if line.strip()])
+        else:
+            delta = pd.read_csv(path, dtype={PRODUCT_ID_COLUMN: str})
+    except FileNotFoundError:
+        print(f"Error: Delta file not found at {path}")
+        return None
+    except ValueError as e:
+        print(f"Error reading delta file {path}: {e}")
+        return None
+    if PRODUCT_ID_COLUMN not in delta.columns:
+        print(f"Error: Delta file {path} has no '{PRODUCT_ID_COLUMN}' column")
+        return None
+    return delta
+
+
+def _empty_result():
+    return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+
+def _top_k(sq_dist, k):
+    if k < len(sq_dist):
+        candidates = np.argpartition(sq_dist, k - 1)[:k]
+    else:
+        candidates = np.arange(len(sq_dist))
+    return candidates[np.argsort(sq_dist[candidates], kind='stable')]
+
+
+def _merge_results(first, second, top_n=None):
+    rows = np.concatenate([first[0], second[0]])
+    distances = np.concatenate([first[1], second[1]])
+    order = np.argsort(distances, kind='stable')
+    if top_n is not None:
+        order = order[:top_n]
+    return rows[order], distances[order]
+
+
+def _block_top_k(queries, points, k, dead=None, block_size=1024):
+    # Row-wise top-k over a queries x points distance matrix, one block of
+    # queries at a time so the temporary matrix stays block_size x len(points).
+    points = np.asarray(points, dtype=np.float64)
+    point_norms = np.einsum('ij,ij->i', points, points)
+    best = np.empty((len(queries), k), dtype=np.intp)
+    best_dist = np.empty((len(queries), k), dtype=np.float32)
+    for start in range(0, len(queries), block_size):
+        block = queries[start:start + block_size]
+        sq_dist = np.einsum('ij,ij->i', block, block)[:, None] + point_norms[None, :] - 2.0 * (block @ points.T)
+        np.maximum(sq_dist, 0.0, out=sq_dist)
+        if dead is not None:
+            sq_dist[:, dead] = np.inf
+
+        if k < len(points):
+            candidates = np.argpartition(sq_dist, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(len(points)), (len(block), k))
+        candidate_dist = np.take_along_axis(sq_dist, candidates, axis=1)
+        order = np.argsort(candidate_dist, axis=1, kind='stable')
+
+        best[start:start + len(block)] = np.take_along_axis(candidates, order, axis=1)
+        best_dist[start:start + len(block)] = np.sqrt(np.take_along_axis(candidate_dist, order, axis=1))
+    return best, best_dist
+
+
+class _Partition:
+    # All products of one gender. The main segment is indexed: prices by a
+    # stable sort order (range lookups via searchsorted), categories by sorted
+    # per-code position lists and colors by a lazily built CIELAB KD-tree, so
+    # filters resolve to a candidate set before any distance is computed.
+    # Updates never touch those indexes: removed rows are tombstoned in
+    # `deleted` and new rows go to a small delta segment that is scanned
+    # exhaustively, until the owning Catalog compacts the partition.
+    # Positions are offsets into the main segment; `rows` maps them to catalog rows.
+
+    def __init__(self, rows, colors, prices, categories):
+        self.rows = rows
+        self.colors = colors.astype(np.float32)
+        self.prices = prices
+        self.categories = categories
+        self.price_order = np.argsort(prices, kind='stable')
+        self.sorted_prices = prices[self.price_order]
+        self.category_positions = {}
+        if len(categories):
+            order = np.argsort(categories, kind='stable')
+            codes, starts = np.unique(categories[order], return_index=True)
+            for code, group in zip(codes, np.split(order, starts[1:])):
+                self.category_positions[int(code)] = group
+        self._color_index = None
+
+        self.deleted = np.zeros(len(rows), dtype=bool)
+        self.num_deleted = 0
+        self.delta_rows = np.empty(0, dtype=np.intp)
+        self.delta_colors = np.empty((0, 3), dtype=np.float32)
+        self.delta_prices = np.empty(0, dtype=np.int32)
+        self.delta_categories = np.empty(0, dtype=np.int16)
+
+    def __len__(self):
+        return len(self.rows) - self.num_deleted + len(self.delta_rows)
+
+    def color_index(self):
+        if self._color_index is None:
+            self._color_index = ColorIndex(self.colors)
+        return self._color_index
+
+    def live_rows(self):
+        return np.sort(np.concatenate([self.rows[~self.deleted], self.delta_rows]))
+
+    def needs_compaction(self):
+        limit = max(COMPACT_MIN_ROWS, int(COMPACT_FRACTION * len(self.rows)))
+        return len(self.delta_rows) + self.num_deleted > limit
+
+    def add(self, rows, colors, prices, categories):
+        self.delta_rows = np.concatenate([self.delta_rows, rows])
+        self.delta_colors = np.concatenate([self.delta_colors, np.asarray(colors, dtype=np.float32)])
+        self.delta_prices = np.concatenate([self.delta_prices, prices])
+        self.delta_categories = np.concatenate([self.delta_categories, categories])
+
+    def remove(self, rows):
+        positions = np.searchsorted(self.rows, rows)
+        in_main = positions < len(self.rows)
+        in_main[in_main] = self.rows[positions[in_main]] == rows[in_main]
+        newly_deleted = positions[in_main][~self.deleted[positions[in_main]]]
+        self.deleted[newly_deleted] = True
+        self.num_deleted += len(np.unique(newly_deleted))
+
+        if len(self.delta_rows) and not in_main.all():
+            keep = ~np.isin(self.delta_rows, rows[~in_main])
+            self.delta_rows = self.delta_rows[keep]
+            self.delta_colors = self.delta_colors[keep]
+            self.delta_prices = self.delta_prices[keep]
+            self.delta_categories = self.delta_categories[keep]
+
+    def _price_bounds(self, min_price, max_price):
+        lo = 0 if min_price is None else np.searchsorted(self.sorted_prices, min_price, side='left')
+        hi = len(self.sorted_prices) if max_price is None else np.searchsorted(self.sorted_prices, max_price, side='right')
+        return lo, hi
+
+    def candidates(self, category_codes=None, min_price=None, max_price=None):
+        # Live main-segment positions matching the filters; None means "no
+        # filter": the caller scans the whole main segment.
+        positions = self._filtered_positions(category_codes, min_price, max_price)
+        if positions is not None and self.num_deleted:
+            positions = positions[~self.deleted[positions]]
+        return positions
+
+    def _filtered_positions(self, category_codes, min_price, max_price):
+        has_price = min_price is not None or max_price is not None
+        if category_codes is None and not has_price:
+            return None
+        if has_price and min_price is None:
+            min_price = 0  # unknown prices are stored as MISSING_PRICE and never match a price filter
+        lo, hi = self._price_bounds(min_price, max_price)
+        if category_codes is None:
+            return np.sort(self.price_order[lo:hi])
+
+        groups = [self.category_positions[code] for code in category_codes if code in self.category_positions]
+        if not groups:
+            return np.empty(0, dtype=np.intp)
+        positions = np.sort(np.concatenate(groups)) if len(groups) > 1 else groups[0]
+        if not has_price:
+            return positions
+
+        # Probe whichever side is smaller against the other.
+        if hi - lo < len(positions):
+            in_range = self.price_order[lo:hi]
+            return np.sort(in_range[np.isin(self.categories[in_range], category_codes)])
+        prices = self.prices[positions]
+        keep = prices >= min_price
+        if max_price is not None:
+            keep &= prices <= max_price
+        return positions[keep]
+
+    def _delta_mask(self, category_codes, min_price, max_price):
+        keep = np.ones(len(self.delta_rows), dtype=bool)
+        if category_codes is not None:
+            keep &= np.isin(self.delta_categories, category_codes)
+        if min_price is not None or max_price is not None:
+            keep &= self.delta_prices >= (min_price or 0)
+        if max_price is not None:
+            keep &= self.delta_prices <= max_price
+        return keep
+
+    def _scan(self, user_color, colors, metric, top_n):
+        if metric == 'lab':
+            colors = rgb_to_lab(colors)
+            user_color = rgb_to_lab(user_color)
+        diff = colors - np.asarray(user_color, dtype=colors.dtype)
+        sq_dist = np.einsum('ij,ij->i', diff, diff)
+        order = _top_k(sq_dist, min(top_n, len(sq_dist)))
+        return order, np.sqrt(sq_dist[order]).astype(np.float32)
+
+    def _nearest_main(self, user_color, top_n, metric, category_codes, min_price, max_price):
+        positions = self.candidates(category_codes, min_price, max_price)
+        live = len(self.rows) - self.num_deleted
+        if positions is None:
+            if live == 0:
+                return _empty_result()
+            if metric == 'lab':
+                # Over-fetch by the tombstone count so enough live rows remain.
+                found, distances = self.color_index().query(user_color, top_n + self.num_deleted)
+                found, distances = found[0], distances[0]
+                keep = ~self.deleted[found]
+                return self.rows[found[keep][:top_n]], distances[keep][:top_n].astype(np.float32)
+            diff = self.colors - np.asarray(user_color, dtype=np.float32)
+            sq_dist = np.einsum('ij,ij->i', diff, diff)
+            if self.num_deleted:
+                sq_dist[self.deleted] = np.inf
+            order = _top_k(sq_dist, min(top_n, live))
+            return self.rows[order], np.sqrt(sq_dist[order])
+
+        if len(positions) == 0:
+            return _empty_result()
+        if metric == 'lab':
+            colors = self.color_index().lab[positions]
+            user_color = rgb_to_lab(user_color)
+        else:
+            colors = self.colors[positions]
+        diff = colors - np.asarray(user_color, dtype=colors.dtype)
+        sq_dist = np.einsum('ij,ij->i', diff, diff)
+        order = _top_k(sq_dist, min(top_n, len(sq_dist)))
+        return self.rows[positions[order]], np.sqrt(sq_dist[order]).astype(np.float32)
+
+    def nearest(self, user_color, top_n, metric, category_codes=None, min_price=None, max_price=None):
+        result = self._nearest_main(user_color, top_n, metric, category_codes, min_price, max_price)
+        if not len(self.delta_rows):
+            return result
+        keep = self._delta_mask(category_codes, min_price, max_price)
+        if not keep.any():
+            return result
+        order, distances = self._scan(user_color, self.delta_colors[keep], metric, top_n)
+        return _merge_results(result, (self.delta_rows[keep][order], distances), top_n)
+
+    def within_radius(self, user_color, delta_e):
+        positions, distances = self.color_index().query_radius(user_color, delta_e) if len(self.rows) \
+            else _empty_result()
+        keep = ~self.deleted[positions]
+        result = (self.rows[positions[keep]], distances[keep].astype(np.float32))
+        if not len(self.delta_rows):
+            return result
+        delta_distances = np.linalg.norm(rgb_to_lab(self.delta_colors) - rgb_to_lab(user_color), axis=1)
+        inside = delta_distances <= delta_e
+        return _merge_results(result, (self.delta_rows[inside], delta_distances[inside].astype(np.float32)))
+
+    def nearest_batch(self, user_colors, top_n, block_size, metric):
+        k = min(top_n, len(self))
+        if metric == 'lab' and not self.num_deleted and not len(self.delta_rows):
+            positions, distances = self.color_index().query(user_colors, k)
+            return self.rows[positions], distances.astype(np.float32)
+
+        rows = np.concatenate([self.rows, self.delta_rows])
+        points = np.concatenate([self.colors, self.delta_colors])
+        dead = np.concatenate([self.deleted, np.zeros(len(self.delta_rows), dtype=bool)]) if self.num_deleted else None
+        if metric == 'lab':
+            points = rgb_to_lab(points)
+            user_colors = rgb_to_lab(user_colors)
+        best, distances = _block_top_k(user_colors, points, k, dead, block_size)
+        return rows[best], distances
+
+
+class _AppendableColumn:
+    # Wraps a read-only column (object array or snapshot PackedStrings) so rows
+    # added by Catalog.upsert can be appended without copying the base.
+
+    def __init__(self, base):
+        self.base = base
+        self.base_size = len(base)
+        self.extra = []
+
+    def __len__(self):
+        return self.base_size + len(self.extra)
+
+    def __getitem__(self, i):
+        return self.base[i] if i < self.base_size else self.extra[i - self.base_size]
+
+    def append(self, values):
+        self.extra.extend(values)
+
+    def take(self, rows):
+        return np.array([self[i] for i in rows], dtype=object)
+
+
+_STORAGE_FIELDS = ('colors', 'gender_codes', 'prices', 'category_codes')
+
+
+class Catalog:
+    # Column-oriented view of the cleaned dataset: skin colors live in one
+    # contiguous (N, 3) uint8 matrix, gender and category are stored as
+    # dictionary-encoded codes and prices as int32, with a _Partition (float32
+    # colors plus filter indexes) precomputed for every gender.
+    # `columns` maps each output column to an array-like supporting .take(rows)
+    # (plain object arrays in memory, packed string buffers from a snapshot).
+    # metric='rgb' is the exhaustive Euclidean RGB scan; metric='lab' queries a
+    # per-partition KD-tree over CIELAB colors, built lazily on first use.
+    # upsert/delete keep row numbers stable: replaced and delisted rows are
+    # tombstoned, new rows are appended to over-allocated storage.
+
+    def __init__(self, columns, colors, gender_codes, gender_labels, prices=None,
+                 category_codes=None, category_labels=()):
+        self.columns = dict(columns)
+        self.colors = np.ascontiguousarray(colors, dtype=np.uint8)
+        self.gender_codes = np.asarray(gender_codes, dtype=np.int16)
+        self.gender_labels = list(gender_labels)
+        if prices is None:
+            prices = np.full(len(self.colors), MISSING_PRICE, dtype=np.int32)
+        self.prices = np.asarray(prices, dtype=np.int32)
+        if category_codes is None:
+            category_codes = np.full(len(self.colors), MISSING_CATEGORY, dtype=np.int16)
+        self.category_codes = np.asarray(category_codes, dtype=np.int16)
+        self.category_labels = list(category_labels)
+        self._gender_lookup = {label.lower(): code for code, label in enumerate(self.gender_labels)}
+        self._category_lookup = {label.lower(): code for code, label in enumerate(self.category_labels)}
+        self._buffers = None
+        self._row_of_id = None
+        self._num_deleted = 0
+        self._build_partitions()
+
+    @classmethod
+    def from_dataframe(cls, df, color_column=NUMERIC_COLOR_COLUMN, gender_column=GENDER_COLUMN):
+        df = df.dropna(subset=[color_column, gender_column])
+        product_ids = df[PRODUCT_ID_COLUMN] if PRODUCT_ID_COLUMN in df.columns else df.index.to_series()
+        df = df.assign(**{PRODUCT_ID_COLUMN: product_ids.astype(str)})
+        if len(df):
+            colors = np.vstack(df[color_column].to_numpy())
+        else:
+            colors = np.empty((0, 3), dtype=np.uint8)
+        genders = pd.Categorical(df[gender_column].astype(str).str.strip().str.lower())
+        if CATEGORY_COLUMN in df.columns:
+            categories = pd.Categorical(df[CATEGORY_COLUMN].str.strip().str.lower())
+            category_codes, category_labels = categories.codes, categories.categories
+        else:
+            category_codes, category_labels = None, ()
+        columns = {col: df[col].to_numpy(dtype=object) for col in OUTPUT_COLUMNS}
+        return cls(columns, colors, genders.codes, genders.categories, parse_prices(df[PRICE_COLUMN]),
+                   category_codes, category_labels)
+
+    def _build_partitions(self):
+        self._partitions = {}
+        for code in range(len(self.gender_labels)):
+            rows = np.flatnonzero(self.gender_codes == code)
+            self._partitions[code] = self._new_partition(rows)
+
+    def _new_partition(self, rows):
+        return _Partition(rows, self.colors[rows], self.prices[rows], self.category_codes[rows])
+
+    def __len__(self):
+        return len(self.colors) - self._num_deleted
+
+    @property
+    def genders(self):
+        return [label for code, label in enumerate(self.gender_labels) if len(self._partitions[code])]
+
+    @property
+    def categories(self):
+        return list(self.category_labels)
+
+    def gender_code(self, gender):
+        if not isinstance(gender, str):
+            return None
+        return self._gender_lookup.get(gender.strip().lower())
+
+    def _category_codes(self, category):
+        if category is None:
+            return None
+        names = [category] if isinstance(category, str) else category
+        keys = dict.fromkeys(name.strip().lower() for name in names)
+        return [self._category_lookup[key] for key in keys if key in self._category_lookup]
+
+    def partition_size(self, gender):
+        code = self.gender_code(gender)
+        if code is None:
+            return 0
+        return len(self._partitions[code])
+
+    def nearest(self, user_color, gender, top_n=5, metric=DEFAULT_METRIC, category=None,
+                min_price=None, max_price=None):
+        code = self.gender_code(gender)
+        if code is None or user_color is None or top_n <= 0:
+            return _empty_result()
+        if metric not in METRICS:
+            raise ValueError(f"Unknown color metric '{metric}', expected one of {METRICS}")
+        return self._partitions[code].nearest(user_color, top_n, metric, self._category_codes(category),
+                                              min_price, max_price)
+
+    def within_radius(self, user_color, gender, delta_e):
+        # All products of one gender within a CIE76 delta E of the user, nearest first.
+        code = self.gender_code(gender)
+        if code is None or user_color is None or len(self._partitions[code]) == 0:
+            return _empty_result()
+        return self._partitions[code].within_radius(user_color, delta_e)
+
+    def nearest_batch(self, user_colors, gender, top_n=5, block_size=1024, metric=DEFAULT_METRIC):
+        user_colors = np.asarray(user_colors, dtype=np.float64).reshape(-1, 3)
+        code = self.gender_code(gender)
+        if code is None or min(top_n, len(self._partitions[code])) <= 0:
+            return np.empty((len(user_colors), 0), dtype=np.intp), np.empty((len(user_colors), 0), dtype=np.float32)
+        if metric not in METRICS:
+            raise ValueError(f"Unknown color metric '{metric}', expected one of {METRICS}")
+        return self._partitions[code].nearest_batch(user_colors, top_n, block_size, metric)
+
+    def _to_frame(self, rows, distances):
+        recommendations = pd.DataFrame({col: self.columns[col].take(rows) for col in OUTPUT_COLUMNS})
+        recommendations[DISTANCE_COLUMN] = distances
+        return recommendations
+
+    def recommend(self, user_color, gender, top_n=5, metric=DEFAULT_METRIC, category=None,
+                  min_price=None, max_price=None):
+        return self._to_frame(*self.nearest(user_color, gender, top_n, metric, category, min_price, max_price))
+
+    def recommend_within(self, user_color, gender, delta_e, top_n=None):
+        rows, distances = self.within_radius(user_color, gender, delta_e)
+        if top_n is not None:
+            rows, distances = rows[:top_n], distances[:top_n]
+        return self._to_frame(rows, distances)
+
+    def _id_index(self):
+        if self._row_of_id is None:
+            ids = self.columns[PRODUCT_ID_COLUMN]
+            self._row_of_id = {ids[row]: row for row in range(len(ids))}
+        return self._row_of_id
+
+    def _encode(self, values, labels, lookup):
+        codes = np.empty(len(values), dtype=np.int16)
+        for i, value in enumerate(values):
+            if not isinstance(value, str) or not value.strip():
+                codes[i] = MISSING_CATEGORY
+                continue
+            key = value.strip().lower()
+            if key not in lookup:
+                lookup[key] = len(labels)
+                labels.append(key)
+            codes[i] = lookup[key]
+        return codes
+
+    def _append_storage(self, colors, gender_codes, prices, category_codes):
+        # Storage is over-allocated (doubling) so single-product upserts stay
+        # amortised O(1); the first append also copies any read-only snapshot maps.
+        n, m = len(self.colors), len(colors)
+        capacity = len(self._buffers['colors']) if self._buffers else 0
+        if n + m > capacity:
+            capacity = max(n + m, 2 * capacity, COMPACT_MIN_ROWS)
+            buffers = {}
+            for name in _STORAGE_FIELDS:
+                current = getattr(self, name)
+                buffer = np.empty((capacity,) + current.shape[1:], dtype=current.dtype)
+                buffer[:n] = current
+                buffers[name] = buffer
+            self._buffers = buffers
+        new_values = dict(zip(_STORAGE_FIELDS, (colors, gender_codes, prices, category_codes)))
+        for name in _STORAGE_FIELDS:
+            self._buffers[name][n:n + m] = new_values[name]
+            setattr(self, name, self._buffers[name][:n + m])
+        return np.arange(n, n + m)
+
+    def _remove_rows(self, rows):
+        rows = np.asarray(rows, dtype=np.intp)
+        codes = self.gender_codes[rows]
+        for code in np.unique(codes):
+            self._partitions[int(code)].remove(np.sort(rows[codes == code]))
+        self._num_deleted += len(rows)
+        return set(int(c) for c in codes)
+
+    def _compact(self, codes):
+        for code in codes:
+            partition = self._partitions[code]
+            if partition.needs_compaction():
+                self._partitions[code] = self._new_partition(partition.live_rows())
+
+    def delete(self, product_ids):
+        id_index = self._id_index()
+        rows = [id_index.pop(pid) for pid in dict.fromkeys(product_ids) if pid in id_index]
+        if rows:
+            self._compact(self._remove_rows(rows))
+        return len(rows)
+
+    def upsert(self, df):
+        # Insert or replace products from rows in the final.csv schema. Rows that
+        # would not survive clean_dataset remove the product instead.
+        df = df.drop_duplicates(subset=[PRODUCT_ID_COLUMN], keep='last')
+        valid, colors = valid_product_mask(df)
+        product_ids = df[PRODUCT_ID_COLUMN].astype(str).to_numpy()
+
+        id_index = self._id_index()
+        replaced = [id_index.pop(pid) for pid in product_ids if pid in id_index]
+        touched = self._remove_rows(replaced) if replaced else set()
+
+        added = df[valid]
+        if len(added):
+            gender_codes = self._encode(added[GENDER_COLUMN].astype(str).tolist(), self.gender_labels,
+                                        self._gender_lookup)
+            for code in range(len(self._partitions), len(self.gender_labels)):
+                self._partitions[code] = self._new_partition(np.empty(0, dtype=np.intp))
+            if CATEGORY_COLUMN in added.columns:
+                category_codes = self._encode(added[CATEGORY_COLUMN].tolist(), self.category_labels,
+                                              self._category_lookup)
+            else:
+                category_codes = np.full(len(added), MISSING_CATEGORY, dtype=np.int16)
+            new_colors = np.vstack(colors[valid].to_numpy()).astype(np.uint8)
+            prices = parse_prices(added[PRICE_COLUMN]) if PRICE_COLUMN in added.columns \
+                else np.full(len(added), MISSING_PRICE, dtype=np.int32)
+
+            rows = self._append_storage(new_colors, gender_codes, prices, category_codes)
+            for col in OUTPUT_COLUMNS:
+                if not isinstance(self.columns[col], _AppendableColumn):
+                    self.columns[col] = _AppendableColumn(self.columns[col])
+                values = added[col].tolist() if col in added.columns else [None] * len(added)
+                self.columns[col].append([str(pid) for pid in product_ids[valid]] if col == PRODUCT_ID_COLUMN
+                                         else values)
+            for row, pid in zip(rows, product_ids[valid]):
+                id_index[pid] = int(row)
+            for code in np.unique(gender_codes):
+                mask = gender_codes == code
+                self._partitions[int(code)].add(rows[mask], new_colors[mask], prices[mask], category_codes[mask])
+                touched.add(int(code))
+
+        self._compact(touched)
+        return int(valid.sum()), int((~valid).sum())
+
+    def apply_delta(self, delta):
+        if DELTA_OP_COLUMN in delta.columns:
+            ops = delta[DELTA_OP_COLUMN].fillna('upsert').astype(str).str.strip().str.lower()
+            deletes = delta[ops == 'delete']
+            upserts = delta[ops != 'delete']
+        else:
+            deletes, upserts = delta.iloc[0:0], delta
+        deleted = self.delete(deletes[PRODUCT_ID_COLUMN].astype(str).tolist()) if len(deletes) else 0
+        upserted, rejected = self.upsert(upserts) if len(upserts) else (0, 0)
+        return {'upserted': upserted, 'rejected': rejected, 'deleted': deleted}
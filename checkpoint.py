@@ -0,0 +1,93 @@
+import json
+import os
+from collections import Counter
+
+import pandas as pd
+
+from catalog import PRODUCT_ID_COLUMN
+
+CHECKPOINT_SUFFIX = '.checkpoint.jsonl'
+
+
+def default_checkpoint_path(output_path):
+    return output_path + CHECKPOINT_SUFFIX
+
+
+def _row_keys(chunk, key_column, seen):
+    # product_id where present, the input row number otherwise. Repeats of a
+    # product_id (the scraped data has some) get '#2', '#3'... in input order;
+    # `seen` carries the counts across chunks.
+    if key_column in chunk.columns:
+        bases = [str(key) if pd.notna(key) else f"row:{i}" for i, key in zip(chunk.index, chunk[key_column])]
+    else:
+        bases = [f"row:{i}" for i in chunk.index]
+    keys = []
+    for base in bases:
+        seen[base] += 1
+        keys.append(base if seen[base] == 1 else f"{base}#{seen[base]}")
+    return keys
+
+
+def read_checkpoint(checkpoint_path):
+    # (completed keys, output size in bytes at the last checkpoint), or None.
+    # A torn last line from a crash mid-write is ignored.
+    try:
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return None
+    done, output_bytes = set(), 0
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break
+        done.update(record['keys'])
+        output_bytes = record['output_bytes']
+    return done, output_bytes
+
+
+def process_csv_in_chunks(input_path, output_path, process_chunk, chunk_size, checkpoint_path=None,
+                          key_column=PRODUCT_ID_COLUMN, **to_csv_kwargs):
+    # Streams input_path through process_chunk(DataFrame) -> DataFrame
+    # chunk_size rows at a time. Each result is appended to output_path, then
+    # its keys and the new output size go to a JSON-lines checkpoint. A rerun
+    # truncates output_path back to the last checkpoint (dropping a chunk
+    # written but never checkpointed) and skips every completed key. Returns
+    # the number of rows processed in this run, or None if process_chunk gave up.
+    checkpoint_path = checkpoint_path or default_checkpoint_path(output_path)
+    state = read_checkpoint(checkpoint_path)
+    if state and os.path.exists(output_path):
+        done, output_bytes = state
+        with open(output_path, 'r+b') as f:
+            f.truncate(output_bytes)
+        print(f"Resuming from {checkpoint_path}: {len(done)} products already written to {output_path}")
+    else:
+        done, output_bytes = set(), 0
+        for path in (output_path, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    processed = 0
+    seen = Counter()
+    for chunk in pd.read_csv(input_path, chunksize=chunk_size):
+        keys = _row_keys(chunk, key_column, seen)
+        pending = [key not in done for key in keys]
+        if not any(pending):
+            continue
+        chunk = chunk[pending]
+        keys = [key for key, is_pending in zip(keys, pending) if is_pending]
+
+        result = process_chunk(chunk)
+        if result is None:
+            return None
+        result.to_csv(output_path, mode='a', header=output_bytes == 0, index=False, **to_csv_kwargs)
+        output_bytes = os.path.getsize(output_path)
+        with open(checkpoint_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'keys': keys, 'output_bytes': output_bytes}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        done.update(keys)
+        processed += len(chunk)
+        print(f"Checkpoint: {len(done)} products written to {output_path}")
+    return processed
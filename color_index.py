@@ -0,0 +1,48 @@
+import numpy as np
+from sklearn.neighbors import KDTree
+
+LEAF_SIZE = 40
+
+# sRGB (D65) -> XYZ -> CIELAB
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+_EPSILON = 216 / 24389
+_KAPPA = 24389 / 27
+
+
+def rgb_to_lab(rgb):
+    rgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = (linear @ _RGB_TO_XYZ.T) / _WHITE_D65
+    f = np.where(xyz > _EPSILON, np.cbrt(xyz), (_KAPPA * xyz + 16) / 116)
+    fx, fy, fz = f[..., 0], f[..., 1], f[..., 2]
+    return np.stack([116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)], axis=-1)
+
+
+class ColorIndex:
+    # KD-tree over one partition's colors in CIELAB, so distances are CIE76
+    # delta E. Positions returned are offsets into the partition.
+
+    def __init__(self, colors_rgb, leaf_size=LEAF_SIZE):
+        self.size = len(colors_rgb)
+        self.lab = rgb_to_lab(np.asarray(colors_rgb).reshape(-1, 3))
+        self.tree = KDTree(self.lab, leaf_size=leaf_size) if self.size else None
+
+    def query(self, user_colors_rgb, k):
+        user_lab = rgb_to_lab(np.asarray(user_colors_rgb).reshape(-1, 3))
+        k = min(k, self.size)
+        if k <= 0:
+            return np.empty((len(user_lab), 0), dtype=np.intp), np.empty((len(user_lab), 0))
+        distances, positions = self.tree.query(user_lab, k=k, sort_results=True)
+        return positions, distances
+
+    def query_radius(self, user_color_rgb, delta_e):
+        if not self.size:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        user_lab = rgb_to_lab(np.asarray(user_color_rgb).reshape(1, 3))
+        positions, distances = self.tree.query_radius(user_lab, r=delta_e, return_distance=True, sort_results=True)
+        return positions[0], distances[0]
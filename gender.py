@@ -1,16 +1,19 @@
+import argparse
 import pandas as pd
 import requests
 from bs4 import BeautifulSoup
-import time
-import random
 import re
-from collections import defaultdict
+from checkpoint import process_csv_in_chunks
+from page_cache import DEFAULT_CACHE_DIR, DEFAULT_TTL, PageCache
+from page_fetch import BURST, MAX_WORKERS, RATE_PER_HOST, configure_default_fetcher, default_fetcher
 
 INPUT_CSV_PATH = './data/myntra_data_with_skin_color.csv'
 OUTPUT_CSV_PATH = './data/myntra_data_with_gender_freq_v2.csv'
 URL_COLUMN = 'product_url'
 GENDER_COLUMN = 'detected_gender_freq'
 
+PAGE_CACHE_DIR = DEFAULT_CACHE_DIR
+
 GENDER_KEYWORDS = {
     'Girls': ['girl', 'girls'],
     'Boys': ['boy', 'boys'],
@@ -19,106 +22,191 @@ GENDER_KEYWORDS = {
     'Kids': ['kids', 'children', 'child', 'junior', 'youth'],
     'Unisex': ['unisex', 'all genders'],
 }
+TIE_BREAK_ORDER = ['Women', 'Men', 'Girls', 'Boys', 'Unisex', 'Kids']
 
-def get_gender_by_frequency_targeted(url):
-    if not url or not isinstance(url, str) or not url.startswith('http'):
-        return "Invalid URL"
+# One whole-word alternation over every keyword. Whole-word keywords can never
+# overlap, so one findall pass gives the same per-gender counts as a separate
+# re.findall per keyword.
+KEYWORD_GENDERS = {keyword: gender for gender, keywords in GENDER_KEYWORDS.items() for keyword in keywords}
+GENDER_KEYWORD_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(re.escape(k) for k in sorted(KEYWORD_GENDERS, key=len, reverse=True)) + r')\b'
+)
 
-    print(f"--- Processing URL: {url} ---")
+def count_gender_keywords(search_text):
+    gender_counts = dict.fromkeys(GENDER_KEYWORDS, 0)
+    for keyword in GENDER_KEYWORD_PATTERN.findall(search_text):
+        gender_counts[KEYWORD_GENDERS[keyword]] += 1
+    return gender_counts
 
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept-Language': 'en-US,en;q=0.9'
-        }
-        response = requests.get(url, headers=headers, timeout=25)
-        response.raise_for_status()
+def decide_gender(gender_counts, verbose=True):
+    if verbose:
+        print(f"Final Counts: {dict(gender_counts)}")
 
-        content_type = response.headers.get('content-type', '').lower()
-        if 'html' not in content_type:
-            print(f"Warning: Non-HTML content type '{content_type}' for URL: {url}")
+    if not any(gender_counts.values()):
+        if verbose:
+            print("Result: Not Found (Zero Counts)")
+        return "Not Found"
 
-        soup = BeautifulSoup(response.content, 'html.parser')
+    max_count = max(gender_counts.values())
+    winners = [gender for gender, count in gender_counts.items() if count == max_count]
+    if verbose:
+        print(f"Max Count: {max_count}, Winners (pre-tiebreak): {winners}")
 
-        search_text = ""
+    if len(winners) == 1:
+        if verbose:
+            print(f"Result: {winners[0]}")
+        return winners[0]
+    for preferred_gender in TIE_BREAK_ORDER:
+        if preferred_gender in winners:
+            if verbose:
+                print(f"Result (Tie-Breaker): {preferred_gender}")
+            return preferred_gender
+    if verbose:
+        print(f"Result (Tie-Fallback): {winners[0]}")
+    return winners[0]
 
-        title_tag = soup.find('title')
-        if title_tag:
-            search_text += title_tag.get_text(separator=' ', strip=True).lower() + " "
+def classify_gender_texts(texts):
+    # Batch form for already-extracted, lowercased texts: one compiled pattern,
+    # no per-text logging. Empty or missing texts give "Not Found".
+    return [decide_gender(count_gender_keywords(text), verbose=False) if isinstance(text, str) else "Not Found"
+            for text in texts]
 
-        h1_tag = soup.find('h1', class_='pdp-title')
-        if h1_tag:
-            search_text += h1_tag.get_text(separator=' ', strip=True).lower() + " "
-        else:
-             h1_tag = soup.find('h1')
-             if h1_tag:
-                  search_text += h1_tag.get_text(separator=' ', strip=True).lower() + " "
-
-        breadcrumb_container = soup.find('div', class_='breadcrumbs-container')
-        if breadcrumb_container:
-            links = breadcrumb_container.find_all('a', class_='breadcrumbs-link')
-            for link in links:
-                search_text += link.get_text(separator=' ', strip=True).lower() + " "
-        else:
-             breadcrumb_divs = soup.find_all('div', class_=re.compile(r'breadcrumb', re.I))
-             for div in breadcrumb_divs:
-                  links = div.find_all('a')
-                  for link in links:
-                       search_text += link.get_text(separator=' ', strip=True).lower() + " "
-
-        description_div = soup.find('div', class_='pdp-product-description-content')
-        if description_div:
-            search_text += description_div.get_text(separator=' ', strip=True).lower() + " "
-        else:
-             desc_divs = soup.find_all('div', attrs={'class': re.compile(r'desc', re.I)})
-             for div in desc_divs:
-                  if len(div.get_text()) < 1000:
-                       search_text += div.get_text(separator=' ', strip=True).lower() + " "
+# Offline tier: the same keywords counted in fields the catalog already has,
+# the product_url slug (myntra.com/<category>/<brand>/<slug>/<id>/buy) and the
+# name and description columns. Rows with one clear winner skip the page fetch.
+URL_SLUG_PATTERN = r'/([^/?#]+)/\d+(?:/buy)?/?(?:[?#]|$)'
+LOCAL_TEXT_COLUMNS = ['product_name', 'description']
+GENDER_CATEGORY_PATTERNS = {
+    gender: r'\b(?:' + '|'.join(re.escape(k) for k in sorted(keywords, key=len, reverse=True)) + r')\b'
+    for gender, keywords in GENDER_KEYWORDS.items()
+}
 
-        print(f"Extracted Text Snippet (first 300 chars): {search_text[:300]}")
+def local_gender_text(df):
+    text = pd.Series('', index=df.index, dtype=object)
+    if URL_COLUMN in df.columns:
+        slug = df[URL_COLUMN].astype(str).str.extract(URL_SLUG_PATTERN, expand=False)
+        text = slug.fillna('').str.replace('-', ' ', regex=False)
+    for column in LOCAL_TEXT_COLUMNS:
+        if column in df.columns:
+            text = text + ' ' + df[column].fillna('').astype(str)
+    return text.str.lower()
 
-        if not search_text.strip():
-            print("Error: No targeted text found.")
-            return "Error - No Text Found"
+def score_local_genders(df):
+    # Per-gender keyword counts for every row, one vectorized pass per gender.
+    text = local_gender_text(df)
+    return pd.DataFrame({gender: text.str.count(pattern) for gender, pattern in GENDER_CATEGORY_PATTERNS.items()},
+                        index=df.index)
 
-        gender_counts = defaultdict(int)
-        for gender_category, keywords in GENDER_KEYWORDS.items():
-            category_count = 0
-            for keyword in keywords:
-                pattern = r'\b' + re.escape(keyword) + r'\b'
-                matches = re.findall(pattern, search_text)
-                count = len(matches)
-                category_count += count
-            gender_counts[gender_category] = category_count
+def infer_local_genders(df):
+    # The winning gender where exactly one gender has the top nonzero count,
+    # None where the catalog fields are silent or tied.
+    counts = score_local_genders(df)
+    if counts.empty:
+        return pd.Series(None, index=df.index, dtype=object)
+    max_count = counts.max(axis=1)
+    clear_winner = (max_count > 0) & (counts.eq(max_count, axis=0).sum(axis=1) == 1)
+    return counts.idxmax(axis=1).astype(object).where(clear_winner, None)
 
-        print(f"Final Counts: {dict(gender_counts)}")
+_page_cache = None
+# Bump when extract_search_text changes; cached pages are then re-extracted
+# from their stored bodies.
+SEARCH_TEXT_VERSION = 1
 
-        if not any(gender_counts.values()):
-            print("Result: Not Found (Zero Counts)")
-            return "Not Found"
+def use_page_cache(cache):
+    # Read product pages through a PageCache (None turns caching off).
+    global _page_cache
+    _page_cache = cache
 
-        max_count = 0
-        for count in gender_counts.values():
-             if count > max_count:
-                  max_count = count
+def extract_search_text(html):
+    soup = BeautifulSoup(html, 'html.parser')
 
-        winners = [gender for gender, count in gender_counts.items() if count == max_count]
-        print(f"Max Count: {max_count}, Winners (pre-tiebreak): {winners}")
+    search_text = ""
 
-        if len(winners) == 1:
-            print(f"Result: {winners[0]}")
-            return winners[0]
-        elif len(winners) > 1:
-            priority_order = ['Women', 'Men', 'Girls', 'Boys', 'Unisex', 'Kids']
-            for preferred_gender in priority_order:
-                if preferred_gender in winners:
-                    print(f"Result (Tie-Breaker): {preferred_gender}")
-                    return preferred_gender
-            print(f"Result (Tie-Fallback): {winners[0]}")
-            return winners[0]
+    title_tag = soup.find('title')
+    if title_tag:
+        search_text += title_tag.get_text(separator=' ', strip=True).lower() + " "
+
+    h1_tag = soup.find('h1', class_='pdp-title')
+    if h1_tag:
+        search_text += h1_tag.get_text(separator=' ', strip=True).lower() + " "
+    else:
+         h1_tag = soup.find('h1')
+         if h1_tag:
+              search_text += h1_tag.get_text(separator=' ', strip=True).lower() + " "
+
+    breadcrumb_container = soup.find('div', class_='breadcrumbs-container')
+    if breadcrumb_container:
+        links = breadcrumb_container.find_all('a', class_='breadcrumbs-link')
+        for link in links:
+            search_text += link.get_text(separator=' ', strip=True).lower() + " "
+    else:
+         breadcrumb_divs = soup.find_all('div', class_=re.compile(r'breadcrumb', re.I))
+         for div in breadcrumb_divs:
+              links = div.find_all('a')
+              for link in links:
+                   search_text += link.get_text(separator=' ', strip=True).lower() + " "
+
+    description_div = soup.find('div', class_='pdp-product-description-content')
+    if description_div:
+        search_text += description_div.get_text(separator=' ', strip=True).lower() + " "
+    else:
+         desc_divs = soup.find_all('div', attrs={'class': re.compile(r'desc', re.I)})
+         for div in desc_divs:
+              if len(div.get_text()) < 1000:
+                   search_text += div.get_text(separator=' ', strip=True).lower() + " "
+    return search_text
+
+def _page_search_text(url, fetcher):
+    # Page text through the page cache when one is set: fresh entries skip the
+    # request and the parse, stale ones are revalidated with a conditional GET.
+    cached = _page_cache.get(url) if _page_cache is not None else None
+    if cached is not None and cached.get('text_version') != SEARCH_TEXT_VERSION:
+        # Extracted by an older extract_search_text: redo it from the stored
+        # page instead of downloading it again.
+        body = _page_cache.get_body(url)
+        if body is None:
+            cached = None
         else:
-             print("Result: Not Found (Logical Error?)")
-             return "Not Found"
+            cached = _page_cache.update_search_text(url, cached, extract_search_text(body), SEARCH_TEXT_VERSION)
+    if cached is not None and cached.get('search_text') is not None:
+        if _page_cache.is_fresh(cached):
+            print("Using cached page text.")
+            return cached['search_text']
+        headers = _page_cache.validators(cached)
+    else:
+        cached, headers = None, None
+
+    response = (fetcher or default_fetcher()).fetch(url, headers=headers)
+    if response.status_code == 304 and cached is not None:
+        print("Page not modified; using cached page text.")
+        _page_cache.refresh(url, cached)
+        return cached['search_text']
+
+    content_type = response.headers.get('content-type', '').lower()
+    if 'html' not in content_type:
+        print(f"Warning: Non-HTML content type '{content_type}' for URL: {url}")
+
+    search_text = extract_search_text(response.content)
+    if _page_cache is not None:
+        _page_cache.put(url, response.content, response.headers, search_text, SEARCH_TEXT_VERSION)
+    return search_text
+
+def get_gender_by_frequency_targeted(url, fetcher=None):
+    if not url or not isinstance(url, str) or not url.startswith('http'):
+        return "Invalid URL"
+
+    print(f"--- Processing URL: {url} ---")
+
+    try:
+        search_text = _page_search_text(url, fetcher)
+
+        print(f"Extracted Text Snippet (first 300 chars): {search_text[:300]}")
+
+        if not search_text.strip():
+            print("Error: No targeted text found.")
+            return "Error - No Text Found"
+
+        return decide_gender(count_gender_keywords(search_text))
 
     except requests.exceptions.Timeout:
         print(f"Timeout error for URL: {url}")
@@ -130,35 +218,79 @@ def get_gender_by_frequency_targeted(url):
         print(f"Error processing URL {url}: {e}")
         return "Error - Processing Failed"
 
-try:
-    df = pd.read_csv(INPUT_CSV_PATH)
-    print(f"Loaded {len(df)} rows from {INPUT_CSV_PATH}")
-except FileNotFoundError:
-    print(f"Error: Input file not found at {INPUT_CSV_PATH}")
-    exit()
-except Exception as e:
-    print(f"Error reading CSV: {e}")
-    exit()
+def detect_genders(df, total_rows=None, fetcher=None, catalog_first=False):
+    # Pages are fetched concurrently on the page fetcher's pool; its per-host
+    # rate limit, not a sleep per row, sets the pace. Results keep row order.
+    # With catalog_first, only rows infer_local_genders leaves open are fetched.
+    if URL_COLUMN not in df.columns:
+        print(f"Error: URL column '{URL_COLUMN}' not found.")
+        return None
 
-if URL_COLUMN not in df.columns:
-    print(f"Error: URL column '{URL_COLUMN}' not found.")
-    exit()
+    fetcher = fetcher or default_fetcher()
+    local_genders = infer_local_genders(df) if catalog_first else pd.Series(None, index=df.index, dtype=object)
+    needs_page = local_genders.isna()
+    if catalog_first:
+        print(f"Classified {(~needs_page).sum()} of {len(df)} products from catalog fields; "
+              f"fetching {needs_page.sum()} product pages.")
+    page_genders = fetcher.map(lambda url: get_gender_by_frequency_targeted(url, fetcher),
+                               df.loc[needs_page, URL_COLUMN])
 
-df[GENDER_COLUMN] = "Not Processed"
+    detected = []
+    for (index, row), local_gender, fetch_page in zip(df.iterrows(), local_genders, needs_page):
+        gender = next(page_genders) if fetch_page else local_gender
+        progress = f"{index + 1}/{total_rows}" if total_rows else f"{index + 1}"
+        source = "page" if fetch_page else "catalog"
+        print(f"Gender Freq V2 {progress}: Product {row.get('product_id', 'N/A')} -> {gender} ({source})")
+        detected.append(gender)
 
-total_rows = len(df)
-for index, row in df.iterrows():
-    print(f"\nProcessing Gender Freq V2 {index + 1}/{total_rows}: Product {row.get('product_id', 'N/A')}")
-    url = row[URL_COLUMN]
+    df[GENDER_COLUMN] = detected
+    return df
 
-    gender = get_gender_by_frequency_targeted(url)
-    df.loc[index, GENDER_COLUMN] = gender
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect the target gender of every product from its page.")
+    parser.add_argument('--chunk-size', type=int, default=0,
+                        help="stream the input this many rows at a time with checkpoint/resume (0 = whole file)")
+    parser.add_argument('--catalog-first', action='store_true',
+                        help="classify from the URL slug, name and description; fetch pages only for unclear rows")
+    parser.add_argument('--page-cache', default=PAGE_CACHE_DIR, help="product page cache directory ('' = no cache)")
+    parser.add_argument('--page-ttl', type=float, default=DEFAULT_TTL / 3600,
+                        help="hours a cached page is used before it is revalidated")
+    parser.add_argument('--rate', type=float, default=RATE_PER_HOST, help="page requests per second per host")
+    parser.add_argument('--burst', type=int, default=BURST, help="requests allowed back to back after idling")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="page requests in flight at once")
+    args = parser.parse_args()
+    configure_default_fetcher(rate_per_host=args.rate, burst=args.burst, max_workers=args.workers)
+    if args.page_cache:
+        use_page_cache(PageCache(args.page_cache, ttl=args.page_ttl * 3600))
 
-    time.sleep(random.uniform(1.8, 4.5))
+    if args.chunk_size > 0:
+        try:
+            processed = process_csv_in_chunks(INPUT_CSV_PATH, OUTPUT_CSV_PATH,
+                                              lambda chunk: detect_genders(chunk, catalog_first=args.catalog_first),
+                                              args.chunk_size)
+        except FileNotFoundError:
+            print(f"Error: Input file not found at {INPUT_CSV_PATH}")
+            exit()
+        if processed is not None:
+            print(f"\nProcessing complete. {processed} products added to {OUTPUT_CSV_PATH}")
+        exit()
 
-try:
-    df.to_csv(OUTPUT_CSV_PATH, index=False)
-    print(f"\nProcessing complete. Targeted frequency-based gender saved to {OUTPUT_CSV_PATH}")
-except Exception as e:
-    print(f"Error saving CSV: {e}")
+    try:
+        df = pd.read_csv(INPUT_CSV_PATH)
+        print(f"Loaded {len(df)} rows from {INPUT_CSV_PATH}")
+    except FileNotFoundError:
+        print(f"Error: Input file not found at {INPUT_CSV_PATH}")
+        exit()
+    except Exception as e:
+        print(f"Error reading CSV: {e}")
+        exit()
+
+    df = detect_genders(df, len(df), catalog_first=args.catalog_first)
+    if df is None:
+        exit()
 
+    try:
+        df.to_csv(OUTPUT_CSV_PATH, index=False)
+        print(f"\nProcessing complete. Targeted frequency-based gender saved to {OUTPUT_CSV_PATH}")
+    except Exception as e:
+        print(f"Error saving CSV: {e}")
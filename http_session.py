@@ -0,0 +1,51 @@
+import threading
+
+import requests
+
+
+class ThreadSessions:
+    # One keep-alive requests.Session per thread (a Session is not safe to
+    # share between threads), each with `headers` set and, when given, the
+    # adapter from adapter_factory() mounted for http and https.
+
+    def __init__(self, headers, adapter_factory=None):
+        self.headers = dict(headers)
+        self.adapter_factory = adapter_factory
+        self._local = threading.local()
+
+    def get(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            if self.adapter_factory is not None:
+                adapter = self.adapter_factory()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+            session.headers.update(self.headers)
+            self._local.session = session
+        return session
+
+
+class LazyDefault:
+    # Process-wide instance of factory(**options), built on first get().
+    # configure() merges new options and closes the current instance, so the
+    # next get() builds one with them; call it before first use.
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.options = {}
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def configure(self, **options):
+        with self._lock:
+            self.options.update(options)
+            if self._instance is not None:
+                self._instance.close()
+                self._instance = None
+
+    def get(self):
+        with self._lock:
+            if self._instance is None:
+                self._instance = self.factory(**self.options)
+            return self._instance
@@ -0,0 +1,158 @@
+import csv
+import hashlib
+import json
+import os
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from cache_store import SizeBoundedCache, evict_least_recent, remove_file, sharded_entries, write_atomic
+
+DEFAULT_CACHE_DIR = './data/image_cache'
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+BLOBS_DIR = 'blobs'
+URLS_DIR = 'urls'
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def decodes_as_image(data):
+    # Error pages and HTML served under an image URL must not be cached.
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) is not None
+
+
+class ImageCache(SizeBoundedCache):
+    # Content-addressed store of downloaded image bytes. Blobs live under
+    # blobs/<sha256 of the bytes> and are shared by every URL serving the same
+    # file; urls/<sha256 of the URL>.json records which blob a URL resolved to.
+    # Every read re-hashes the blob, so a truncated or corrupted file counts as
+    # a miss and is refetched. Total blob size is bounded; the least recently
+    # read blobs go first.
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(max_bytes)
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+        self.corrupt = 0
+        os.makedirs(os.path.join(root, BLOBS_DIR), exist_ok=True)
+        os.makedirs(os.path.join(root, URLS_DIR), exist_ok=True)
+        self._bytes = sum(entry.stat().st_size for entry in self._blob_entries())
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, BLOBS_DIR, digest[:2], digest)
+
+    def _ref_path(self, url):
+        key = url_key(url)
+        return os.path.join(self.root, URLS_DIR, key[:2], key + '.json')
+
+    def _blob_entries(self):
+        return sharded_entries(os.path.join(self.root, BLOBS_DIR))
+
+    def get(self, url):
+        ref_path = self._ref_path(url)
+        try:
+            with open(ref_path, 'r', encoding='utf-8') as f:
+                digest = json.load(f)['sha256']
+            blob_path = self._blob_path(digest)
+            with open(blob_path, 'rb') as f:
+                data = f.read()
+        except (FileNotFoundError, ValueError, KeyError):
+            self._count('misses')
+            return None
+
+        if content_hash(data) != digest:
+            print(f"Image cache entry for {url} failed its integrity check; refetching.")
+            remove_file(blob_path)
+            remove_file(ref_path)
+            self._grow(-len(data))
+            self._count('corrupt')
+            self._count('misses')
+            return None
+
+        os.utime(blob_path)
+        self._count('hits')
+        return data
+
+    def put(self, url, data):
+        digest = content_hash(data)
+        blob_path = self._blob_path(digest)
+        if os.path.exists(blob_path):
+            os.utime(blob_path)
+        else:
+            write_atomic(blob_path, bytes(data), 'wb')
+            if self._grow(len(data)):
+                self.evict()
+        write_atomic(self._ref_path(url), json.dumps({'url': url, 'sha256': digest, 'size': len(data)}), 'w')
+        return digest
+
+    def discard(self, url):
+        # Drops url's entry and its blob, e.g. bytes that turned out not to
+        # decode; other URLs sharing the blob then read as misses too.
+        ref_path = self._ref_path(url)
+        try:
+            with open(ref_path, 'r', encoding='utf-8') as f:
+                blob_path = self._blob_path(json.load(f)['sha256'])
+        except (FileNotFoundError, ValueError, KeyError):
+            return
+        size = os.path.getsize(blob_path) if os.path.exists(blob_path) else 0
+        remove_file(blob_path)
+        remove_file(ref_path)
+        self._grow(-size)
+
+    def evict(self):
+        # Trim blobs back under max_bytes, oldest read first. URL entries that
+        # pointed at an evicted blob are left behind and read as misses.
+        self._set_size(evict_least_recent({entry.path: [entry] for entry in self._blob_entries()}, self.max_bytes))
+
+    def import_scraped_images(self, products_csv, images_dir):
+        # scraper.py saves <product_id>_front.jpg / <product_id>_model.jpg next
+        # to products.csv; register them under the URLs they were fetched from.
+        # Those files are named by product_id alone, and scraper.py numbers
+        # products from product_1 on every run while appending to products.csv,
+        # so a product_id listed more than once may have had its files
+        # overwritten by a later product. Such ids are skipped rather than
+        # registering one product's image under another's URL.
+        with open(products_csv, 'r', newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        id_counts = Counter(row.get('product_id') for row in rows)
+        ambiguous = {product_id for product_id, count in id_counts.items() if count > 1}
+        if ambiguous:
+            print(f"Skipping {len(ambiguous)} product_ids listed more than once in {products_csv}; "
+                  f"their image files may belong to a later scrape.")
+
+        imported = 0
+        for row in rows:
+            if row.get('product_id') in ambiguous:
+                continue
+            for suffix, column in (('front', 'front_image_url'), ('model', 'model_image_url')):
+                url = row.get(column)
+                path = os.path.join(images_dir, f"{row.get('product_id')}_{suffix}.jpg")
+                if not url or not os.path.exists(path):
+                    continue
+                with open(path, 'rb') as image_file:
+                    data = image_file.read()
+                if data and decodes_as_image(data):
+                    self.put(url, data)
+                    imported += 1
+                elif data:
+                    print(f"Skipping {path}: not a decodable image.")
+        return imported
+
+if __name__ == "__main__":
+    import sys
+
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    if not os.path.exists(os.path.join(data_dir, 'products.csv')):
+        print(f"Error: products.csv not found in {data_dir}")
+        sys.exit(1)
+    cache = ImageCache()
+    count = cache.import_scraped_images(os.path.join(data_dir, 'products.csv'), os.path.join(data_dir, 'images'))
+    print(f"Imported {count} scraped images into {cache.root}")
@@ -0,0 +1,215 @@
+import re
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlunparse
+
+import cv2
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from http_session import LazyDefault, ThreadSessions
+from image_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, ImageCache
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'}
+TIMEOUT = 15
+MAX_WORKERS = 16
+MAX_PER_HOST = 8
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+CHUNK_SIZE = 64 * 1024
+IMAGE_CACHE_DIR = DEFAULT_CACHE_DIR
+IMAGE_CACHE_MAX_BYTES = DEFAULT_MAX_BYTES
+# Analysis renditions: CDN hosts whose paths carry a h_<px>,q_<quality>,w_<px>
+# transform segment, and the smaller rendition requested for pose/skin analysis.
+# A width of 0 keeps the original URLs.
+RENDITION_HOSTS = ('assets.myntassets.com',)
+RENDITION_PATTERN = re.compile(r'/h_(\d+),q_(\d+),w_(\d+)/')
+ANALYSIS_WIDTH = 0
+ANALYSIS_QUALITY = 70
+# Consecutive failed renditions after which a host is no longer asked for them.
+RENDITION_HOST_FAILURES = 5
+
+
+def analysis_rendition_url(url, width, quality=ANALYSIS_QUALITY, hosts=RENDITION_HOSTS):
+    # Same asset at `width` px (height scaled to keep the aspect ratio), or None
+    # when the host has no transform segment or the URL is already that small.
+    parsed = urlparse(url)
+    if parsed.netloc not in hosts:
+        return None
+    match = RENDITION_PATTERN.search(parsed.path)
+    if not match:
+        return None
+    height, original_quality, original_width = (int(g) for g in match.groups())
+    if not width or original_width <= width:
+        return None
+    segment = f"/h_{max(1, round(height * width / original_width))},q_{min(quality, original_quality)},w_{width}/"
+    return urlunparse(parsed._replace(path=parsed.path[:match.start()] + segment + parsed.path[match.end():]))
+
+
+def url_image_shape(url):
+    # (height, width) named by a URL's h_<px>,q_<quality>,w_<px> segment, or None.
+    match = RENDITION_PATTERN.search(urlparse(url).path)
+    return (int(match.group(1)), int(match.group(3))) if match else None
+
+
+class ImageFetcher:
+    # Keep-alive HTTP sessions (one per thread, each with a pooled adapter and
+    # urllib3 retries with exponential backoff), a per-host concurrency cap and
+    # bodies streamed into one buffer that cv2.imdecode reads without a copy.
+    # With an ImageCache, bytes are read through it and only misses hit the network.
+    # With a rendition width, images are decoded from the smaller analysis
+    # rendition when the CDN offers one, falling back to the original URL for
+    # any image whose rendition fails. A host is only left out once
+    # rendition_host_failures renditions in a row have failed; a success resets
+    # the count.
+
+    def __init__(self, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST, timeout=TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, headers=None, cache=None,
+                 rendition_width=ANALYSIS_WIDTH, rendition_quality=ANALYSIS_QUALITY, rendition_hosts=RENDITION_HOSTS,
+                 rendition_host_failures=RENDITION_HOST_FAILURES):
+        self.max_workers = max_workers
+        self.cache = cache
+        self.rendition_width = rendition_width
+        self.rendition_quality = rendition_quality
+        self.rendition_hosts = tuple(rendition_hosts)
+        self.rendition_host_failures = rendition_host_failures
+        self._rendition_failures = {}
+        self.timeout = timeout
+        self.headers = dict(HEADERS if headers is None else headers)
+        self._retry = Retry(total=max_retries, connect=max_retries, read=max_retries, status=max_retries,
+                            backoff_factor=backoff_factor, status_forcelist=RETRY_STATUSES,
+                            allowed_methods=frozenset(['GET', 'HEAD']), respect_retry_after_header=True,
+                            raise_on_status=False)
+        self._sessions = ThreadSessions(self.headers, lambda: HTTPAdapter(pool_connections=4,
+                                                                          pool_maxsize=self.max_workers,
+                                                                          max_retries=self._retry))
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(max_per_host))
+        self._host_lock = threading.Lock()
+        self._executor = None
+
+    def _session(self):
+        return self._sessions.get()
+
+    def _slot(self, url):
+        with self._host_lock:
+            return self._host_slots[urlparse(url).netloc]
+
+    def _download(self, url):
+        with self._slot(url):
+            with self._session().get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                buffer = bytearray()
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    buffer += chunk
+        return buffer
+
+    def fetch_bytes(self, url):
+        if self.cache is not None:
+            data = self.cache.get(url)
+            if data is not None:
+                return data
+        buffer = self._download(url)
+        if self.cache is not None and buffer:
+            self.cache.put(url, buffer)
+        return buffer
+
+    def _decode_url(self, url, flags):
+        # Only bytes that decode are cached. A cached entry that does not
+        # decode (an error page stored by an older run) is dropped and the
+        # image downloaded again.
+        if self.cache is not None:
+            data = self.cache.get(url)
+            if data is not None:
+                image = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+                if image is not None:
+                    return image
+                print(f"Cached bytes for {url} could not be decoded; refetching.")
+                self.cache.discard(url)
+        buffer = self._download(url)
+        image = cv2.imdecode(np.frombuffer(buffer, np.uint8), flags)
+        if image is not None and self.cache is not None:
+            self.cache.put(url, buffer)
+        return image
+
+    def fetch_image(self, url, flags=cv2.IMREAD_COLOR):
+        # Returns the decoded BGR image or None; network errors propagate so
+        # callers keep their own reporting.
+        with self._host_lock:
+            hosts = tuple(host for host in self.rendition_hosts
+                          if self._rendition_failures.get(host, 0) < self.rendition_host_failures)
+        rendition_url = analysis_rendition_url(url, self.rendition_width, self.rendition_quality, hosts)
+        if rendition_url:
+            host = urlparse(url).netloc
+            try:
+                image = self._decode_url(rendition_url, flags)
+                error = "could not be decoded" if image is None else None
+            except (requests.exceptions.RequestException, cv2.error) as e:
+                image, error = None, str(e)
+            with self._host_lock:
+                failures = 0 if image is not None else self._rendition_failures.get(host, 0) + 1
+                self._rendition_failures[host] = failures
+            if image is not None:
+                return image
+            print(f"Analysis rendition {rendition_url} failed ({error}); using the original URL.")
+            if failures == self.rendition_host_failures:
+                print(f"{failures} renditions in a row failed for {host}; using original URLs from now on.")
+        return self._decode_url(url, flags)
+
+    def _safe_fetch(self, url):
+        try:
+            return self.fetch_image(url)
+        except (requests.exceptions.RequestException, cv2.error) as e:
+            print(f"Error downloading {url}: {e}")
+            return None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-fetch')
+        return self._executor
+
+    def map(self, fn, urls):
+        # fn(url) on the pool, results in input order.
+        return self.executor.map(fn, urls)
+
+    def fetch_images(self, urls):
+        return list(self.map(self._safe_fetch, urls))
+
+    def fetch_batches(self, url_batches, prefetch=4, fetch_fn=None):
+        # Yields the decoded images of each batch in order while the next
+        # `prefetch` batches are already downloading. fetch_fn(url) replaces
+        # the default fetch-and-decode when a caller wants its own reporting.
+        fetch_fn = fetch_fn or self._safe_fetch
+        pending = deque()
+        for urls in url_batches:
+            pending.append([self.executor.submit(fetch_fn, url) for url in urls])
+            if len(pending) > prefetch:
+                yield [future.result() for future in pending.popleft()]
+        while pending:
+            yield [future.result() for future in pending.popleft()]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def _build_default_fetcher(**options):
+    cache = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES) if IMAGE_CACHE_DIR else None
+    return ImageFetcher(cache=cache, **options)
+
+
+_default = LazyDefault(_build_default_fetcher)
+
+
+def configure_default_fetcher(**options):
+    # ImageFetcher keyword arguments for default_fetcher(); call before first use.
+    _default.configure(**options)
+
+
+def default_fetcher():
+    return _default.get()
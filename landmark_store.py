@@ -0,0 +1,219 @@
+import json
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from snapshot import PackedStrings
+
+STORE_VERSION = 1
+NUM_LANDMARKS = 33
+LANDMARK_FIELDS = ('x', 'y', 'z', 'visibility')
+DEFAULT_STORE_DIR = './data/pose_landmarks'
+META_FILE = 'meta.json'
+ARRAY_NAMES = ('landmarks', 'shapes', 'detected', 'urls.data', 'urls.offsets')
+
+
+def landmarks_to_array(results):
+    if not results or not results.pose_landmarks:
+        return None
+    return np.array([[lm.x, lm.y, lm.z, lm.visibility] for lm in results.pose_landmarks.landmark],
+                    dtype=np.float32)
+
+
+def array_to_results(landmarks):
+    # Rebuilds the attribute shape of a MediaPipe result (pose_landmarks.landmark[i].x ...)
+    # so check_pose_type and is_front_facing run unchanged on stored landmarks.
+    if landmarks is None:
+        return SimpleNamespace(pose_landmarks=None)
+    points = [SimpleNamespace(x=float(x), y=float(y), z=float(z), visibility=float(v)) for x, y, z, v in landmarks]
+    return SimpleNamespace(pose_landmarks=SimpleNamespace(landmark=points))
+
+
+class LandmarkStore:
+    # Pose landmarks of every processed image, keyed by URL: an N x 33 x 4
+    # float32 array (x, y, z, visibility), the N x 3 image shapes and a
+    # detected flag (False when the full model found no person), saved as .npy
+    # files that load memory-mapped. New entries are kept in memory until save().
+    # Each save writes only those entries as a new segment (landmarks.<n>.npy
+    # ...) and then switches meta.json to the new segment list, so saving after
+    # every chunk costs the chunk, not the whole store. A URL found in several
+    # segments takes its newest row. After a save the newest segments are
+    # merged into one while the segment before them holds no more rows than
+    # they do together, which keeps O(log n) segments and rewrites each row
+    # O(log n) times. Files are never overwritten, since they may be memory-
+    # mapped (Windows refuses to replace a mapped file); ones meta.json no
+    # longer lists are deleted once nothing maps them.
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, mmap_mode='r'):
+        self.store_dir = store_dir
+        self.mmap_mode = mmap_mode
+        self.segments = []
+        self._index = {}
+        self._pending = {}
+        self._next_id = 1
+        self._load(mmap_mode)
+
+    def _path(self, name):
+        return os.path.join(self.store_dir, name)
+
+    def _array_path(self, name, segment_id):
+        # Stores written before segments existed use unsuffixed names.
+        return self._path(f"{name}.npy" if segment_id is None else f"{name}.{segment_id}.npy")
+
+    def _load(self, mmap_mode):
+        try:
+            with open(self._path(META_FILE), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if meta.get('version') != STORE_VERSION:
+            print(f"Ignoring landmark store {self.store_dir} written by version {meta.get('version')}")
+            return
+        # Older stores list a single generation instead of segments.
+        segment_ids = [segment_id for segment_id, _ in meta.get('segments', [[meta.get('generation'), None]])]
+        if segment_ids == [segment['id'] for segment in self.segments]:
+            return
+        loaded = {segment['id']: segment for segment in self.segments}
+        self.segments = [loaded.get(segment_id) or self._load_segment(segment_id, mmap_mode)
+                         for segment_id in segment_ids]
+        self._reindex()
+        self._next_id = max(self._ids_on_disk() + [0]) + 1
+
+    def _load_segment(self, segment_id, mmap_mode):
+        arrays = {name: np.load(self._array_path(name, segment_id), mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+        packed = PackedStrings(arrays['urls.data'], arrays['urls.offsets'])
+        return {'id': segment_id, 'landmarks': arrays['landmarks'], 'shapes': arrays['shapes'],
+                'detected': arrays['detected'], 'urls': [packed[i] for i in range(len(packed))]}
+
+    def refresh(self):
+        # Picks up segments another process has saved since this view was
+        # loaded; segments already mapped and pending entries are kept.
+        try:
+            self._load(self.mmap_mode)
+        except FileNotFoundError:
+            # A save replaced the segments between reading meta.json and
+            # mapping them; the next refresh sees the new list.
+            pass
+
+    def _ids_on_disk(self):
+        # Segment ids in file names, including ones a crashed save never listed.
+        ids = []
+        for entry in os.scandir(self.store_dir):
+            for name in ARRAY_NAMES:
+                suffix = entry.name[len(name) + 1:-len('.npy')] if entry.name.startswith(name + '.') else ''
+                if entry.name.endswith('.npy') and suffix.isdigit():
+                    ids.append(int(suffix))
+        return ids
+
+    def _reindex(self):
+        self._index = {}
+        for position, segment in enumerate(self.segments):
+            for row, url in enumerate(segment['urls']):
+                self._index[url] = (position, row)
+
+    def __len__(self):
+        return len(self._index) + sum(1 for url in self._pending if url not in self._index)
+
+    def __contains__(self, url):
+        return url in self._pending or url in self._index
+
+    def get(self, url):
+        # (landmarks or None, image_shape), or None when the URL was never processed.
+        if url in self._pending:
+            return self._pending[url]
+        location = self._index.get(url)
+        if location is None:
+            return None
+        segment, row = self.segments[location[0]], location[1]
+        landmarks = np.asarray(segment['landmarks'][row]) if segment['detected'][row] else None
+        return landmarks, tuple(int(d) for d in segment['shapes'][row])
+
+    def put(self, url, landmarks, image_shape):
+        shape = tuple(image_shape) + (3,) * (3 - len(image_shape))
+        self._pending[url] = (None if landmarks is None else np.asarray(landmarks, dtype=np.float32), shape)
+
+    def merged(self, segments=None):
+        # One segment dict holding the newest row of every saved URL in
+        # `segments` (default: all), older rows first.
+        segments = self.segments if segments is None else segments
+        latest = {}
+        for position, segment in enumerate(segments):
+            for row, url in enumerate(segment['urls']):
+                latest[url] = (position, row)
+        parts = {'landmarks': [], 'shapes': [], 'detected': [], 'urls': []}
+        for position, segment in enumerate(segments):
+            rows = [row for row, url in enumerate(segment['urls']) if latest[url] == (position, row)]
+            for name in ('landmarks', 'shapes', 'detected'):
+                parts[name].append(np.asarray(segment[name][rows]))
+            parts['urls'].extend(segment['urls'][row] for row in rows)
+        merged = {'id': None, 'urls': parts['urls']}
+        for name, empty in (('landmarks', np.zeros((0, NUM_LANDMARKS, len(LANDMARK_FIELDS)), dtype=np.float32)),
+                            ('shapes', np.zeros((0, 3), dtype=np.int32)), ('detected', np.zeros(0, dtype=bool))):
+            merged[name] = np.concatenate([empty] + parts[name])
+        return merged
+
+    def _pending_segment(self):
+        urls = list(self._pending)
+        landmarks = np.zeros((len(urls), NUM_LANDMARKS, len(LANDMARK_FIELDS)), dtype=np.float32)
+        shapes = np.zeros((len(urls), 3), dtype=np.int32)
+        detected = np.zeros(len(urls), dtype=bool)
+        for row, url in enumerate(urls):
+            points, shape = self._pending[url]
+            detected[row] = points is not None
+            if points is not None:
+                landmarks[row] = points
+            shapes[row] = shape
+        return {'id': None, 'landmarks': landmarks, 'shapes': shapes, 'detected': detected, 'urls': urls}
+
+    def _write_segment(self, segment):
+        segment['id'] = self._next_id
+        self._next_id += 1
+        packed = PackedStrings.from_values(segment['urls'])
+        for name, array in (('landmarks', segment['landmarks']), ('shapes', segment['shapes']),
+                            ('detected', segment['detected']), ('urls.data', packed.data),
+                            ('urls.offsets', packed.offsets)):
+            np.save(self._array_path(name, segment['id']), array)
+        return segment
+
+    def save(self):
+        if not self._pending:
+            return 0
+        os.makedirs(self.store_dir, exist_ok=True)
+        segments = self.segments + [self._write_segment(self._pending_segment())]
+        tail = 1
+        while tail < len(segments) and (len(segments[-tail - 1]['urls'])
+                                        <= sum(len(segment['urls']) for segment in segments[-tail:])):
+            tail += 1
+        if tail > 1:
+            segments[-tail:] = [self._write_segment(self.merged(segments[-tail:]))]
+
+        meta_path = self._path(META_FILE)
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'version': STORE_VERSION,
+                       'segments': [[segment['id'], len(segment['urls'])] for segment in segments],
+                       'fields': list(LANDMARK_FIELDS)}, f, indent=2)
+        os.replace(meta_path + '.tmp', meta_path)
+
+        saved = len(self._pending)
+        # Merged segments are in memory, so dropping their maps releases the
+        # files they replaced.
+        self.segments = segments
+        self._pending = {}
+        self._reindex()
+        self._remove_stale_segments()
+        return saved
+
+    def _remove_stale_segments(self):
+        # Files of segments meta.json no longer lists, or of a save interrupted
+        # before its meta.json switch. One still mapped elsewhere (another
+        # process on Windows) is left for a later save.
+        current = {os.path.basename(self._array_path(name, segment['id']))
+                   for segment in self.segments for name in ARRAY_NAMES}
+        for entry in os.scandir(self.store_dir):
+            if (entry.name.endswith('.npy') and entry.name not in current
+                    and any(entry.name.startswith(name + '.') for name in ARRAY_NAMES)):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
@@ -1,12 +1,18 @@
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import pandas as pd
 import requests
 import cv2
 import mediapipe as mp
 import numpy as np
-import io
 import os
 from urllib.parse import urlparse
 import math
+from image_fetch import ANALYSIS_WIDTH, configure_default_fetcher, default_fetcher
+from landmark_store import DEFAULT_STORE_DIR, LandmarkStore, array_to_results, landmarks_to_array
+from checkpoint import process_csv_in_chunks
 
 INPUT_CSV_PATH = './data/pae_dataset.csv'
 OUTPUT_CSV_PATH = './data/myntra_data_updated_front_facing.csv'
@@ -17,11 +23,62 @@ MAX_Y_DIFF_RATIO_SHOULDERS = 0.08
 MAX_Y_DIFF_RATIO_HIPS = 0.08
 MAX_Z_DIFF_SHOULDERS = 0.4
 MAX_Z_DIFF_HIPS = 0.4
+POSE_WORKERS = 1
+SHARD_SIZE = 8
+POSE_MODEL_COMPLEXITY = 2
+CASCADE_SCREEN_COMPLEXITY = 0
+CASCADE_SCREEN_MAX_SIDE = 320
+CASCADE_VISIBILITY_MARGIN = 0.1
+CASCADE_SPREAD_MARGIN = 0.05
+LANDMARK_STORE_DIR = DEFAULT_STORE_DIR
+TUNABLE_THRESHOLDS = ('VISIBILITY_THRESHOLD', 'MIN_VISIBLE_LANDMARKS_OVERALL', 'VERTICAL_SPREAD_THRESHOLD',
+                      'MAX_Y_DIFF_RATIO_SHOULDERS', 'MAX_Y_DIFF_RATIO_HIPS', 'MAX_Z_DIFF_SHOULDERS', 'MAX_Z_DIFF_HIPS')
 
 mp_pose = mp.solutions.pose
-pose_detector = mp_pose.Pose(static_image_mode=True,
-                             model_complexity=2,
-                             min_detection_confidence=0.6)
+_pose_detectors = {}
+# Full-model landmarks already on disk (read-only here) and the ones computed
+# since the last drain, which the parent process adds to the store.
+_landmark_store = None
+_observations = []
+
+def get_pose_detector(model_complexity=POSE_MODEL_COMPLEXITY):
+    # Created on first use so every worker process builds its own graph
+    # instead of inheriting (or pickling) the parent's.
+    detector = _pose_detectors.get(model_complexity)
+    if detector is None:
+        detector = mp_pose.Pose(static_image_mode=True,
+                                model_complexity=model_complexity,
+                                min_detection_confidence=0.6)
+        _pose_detectors[model_complexity] = detector
+    return detector
+
+def close_pose_detector():
+    for detector in _pose_detectors.values():
+        detector.close()
+    _pose_detectors.clear()
+
+def use_landmark_store(store):
+    global _landmark_store
+    _landmark_store = store
+
+def drain_observations():
+    observations = list(_observations)
+    _observations.clear()
+    return observations
+
+def apply_thresholds(overrides):
+    # overrides: {'VISIBILITY_THRESHOLD': '0.7', ...}; values take the type of the default.
+    for name, value in overrides.items():
+        if name not in TUNABLE_THRESHOLDS:
+            raise ValueError(f"Unknown threshold '{name}', expected one of {list(TUNABLE_THRESHOLDS)}")
+        globals()[name] = type(globals()[name])(value)
+
+def _init_worker(landmark_store_dir, thresholds, fetcher_options):
+    configure_default_fetcher(**fetcher_options)
+    get_pose_detector()
+    apply_thresholds(thresholds)
+    if landmark_store_dir:
+        use_landmark_store(LandmarkStore(landmark_store_dir))
 
 LM = mp.solutions.pose.PoseLandmark
 FULL_BODY_REQUIRED_LANDMARKS = {
@@ -34,31 +91,47 @@ UPPER_BODY_REQUIRED_LANDMARKS = {
 FRONT_FACING_CHECK_LANDMARKS = {
     LM.NOSE, LM.LEFT_SHOULDER, LM.RIGHT_SHOULDER, LM.LEFT_HIP, LM.RIGHT_HIP
 }
+CASCADE_CHECK_LANDMARKS = FULL_BODY_REQUIRED_LANDMARKS | UPPER_BODY_REQUIRED_LANDMARKS | FRONT_FACING_CHECK_LANDMARKS
 
-def _process_image_url(image_url):
+def _fetch_image(image_url):
     if not image_url or not isinstance(image_url, str):
-        return None, None, None
+        return None
     try:
         parsed_url = urlparse(image_url)
         if not all([parsed_url.scheme, parsed_url.netloc]):
-             return None, None, None
+             return None
     except ValueError:
-        return None, None, None
+        return None
     try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'}
-        response = requests.get(image_url, stream=True, timeout=15, headers=headers)
-        response.raise_for_status()
-        image_data = io.BytesIO(response.content)
-        image_np = cv2.imdecode(np.frombuffer(image_data.read(), np.uint8), cv2.IMREAD_COLOR)
+        image_np = default_fetcher().fetch_image(image_url)
         if image_np is None:
             print(f"Failed to decode image from URL: {image_url}")
-            return None, None, None
-        image_rgb = cv2.cvtColor(image_np, cv2.COLOR_BGR2RGB)
-        results = pose_detector.process(image_rgb)
-        return results, image_url, image_np.shape
+        return image_np
     except requests.exceptions.RequestException as e:
         print(f"Error downloading {image_url}: {e}")
+        return None
+    except cv2.error as e:
+         print(f"OpenCV error processing {image_url}: {e}")
+         return None
+    except Exception as e:
+        print(f"An unexpected error occurred processing {image_url}: {e}")
+        return None
+
+def _process_image(image_np, image_url, model_complexity=POSE_MODEL_COMPLEXITY):
+    if image_np is None:
         return None, None, None
+    full_model = model_complexity == POSE_MODEL_COMPLEXITY
+    if full_model and _landmark_store is not None:
+        stored = _landmark_store.get(image_url)
+        if stored is not None:
+            landmarks, image_shape = stored
+            return array_to_results(landmarks), image_url, image_shape
+    try:
+        image_rgb = cv2.cvtColor(image_np, cv2.COLOR_BGR2RGB)
+        results = get_pose_detector(model_complexity).process(image_rgb)
+        if full_model:
+            _observations.append((image_url, landmarks_to_array(results), image_np.shape))
+        return results, image_url, image_np.shape
     except cv2.error as e:
          print(f"OpenCV error processing {image_url}: {e}")
          return None, None, None
@@ -66,6 +139,18 @@ def _process_image_url(image_url):
         print(f"An unexpected error occurred processing {image_url}: {e}")
         return None, None, None
 
+def _process_image_url(image_url):
+    return _process_image(_fetch_image(image_url), image_url)
+
+def _candidate_urls(row):
+    candidate_urls = []
+    if pd.notna(row['model_image_url']) and isinstance(row['model_image_url'], str):
+        candidate_urls.append(row['model_image_url'])
+    if pd.notna(row['additional_images']) and isinstance(row['additional_images'], str):
+        add_urls = row['additional_images'].replace(';',',').split(',')
+        candidate_urls.extend([url.strip() for url in add_urls if url.strip() and url.strip() not in candidate_urls])
+    return list(dict.fromkeys(candidate_urls))
+
 def get_landmark_if_visible(landmarks, landmark_enum, min_visibility):
     idx = landmark_enum.value
     if idx < len(landmarks) and landmarks[idx].visibility > min_visibility:
@@ -161,79 +246,344 @@ def check_pose_type(results, image_shape):
     return 'None', False
 
 
-try:
-    df = pd.read_csv(INPUT_CSV_PATH)
-    print(f"Loaded {len(df)} rows from {INPUT_CSV_PATH}")
-except FileNotFoundError:
-    print(f"Error: Input file not found at {INPUT_CSV_PATH}")
-    exit()
-except Exception as e:
-    print(f"Error reading CSV: {e}")
-    exit()
-
-df['new_model_image_url'] = np.nan
-
-total_rows = len(df)
-for index, row in df.iterrows():
-    print(f"\nProcessing Product {index + 1}/{total_rows}: {row.get('product_id', 'N/A')}")
-
-    candidate_urls = []
-    if pd.notna(row['model_image_url']) and isinstance(row['model_image_url'], str):
-        candidate_urls.append(row['model_image_url'])
-    if pd.notna(row['additional_images']) and isinstance(row['additional_images'], str):
-        add_urls = row['additional_images'].replace(';',',').split(',')
-        candidate_urls.extend([url.strip() for url in add_urls if url.strip() and url.strip() not in candidate_urls])
-    unique_candidate_urls = list(dict.fromkeys(candidate_urls))
-
-    print(f"Found {len(unique_candidate_urls)} unique candidate URLs.")
-
-    candidate_results = []
-
-    for img_url in unique_candidate_urls:
-        results, _, img_shape = _process_image_url(img_url)
-        if results and img_shape:
-            pose_type, front_facing = check_pose_type(results, img_shape)
-            if pose_type != 'None':
-                print(f"  URL: {img_url} -> Type: {pose_type}, Front: {front_facing}")
-                candidate_results.append({'url': img_url, 'type': pose_type, 'front': front_facing})
-
-    selected_url = None
+POSE_TYPES = np.array(['None', 'Upper', 'Full'])
+
+
+def _landmark_indices(landmark_set):
+    return np.array(sorted(lm.value for lm in landmark_set))
+
+
+def classify_poses(landmarks, image_heights, detected=None):
+    # Array version of check_pose_type for an (images x 33 x 4) batch of
+    # (x, y, z, visibility) landmarks. Returns (pose types, front-facing flags),
+    # matching the scalar functions row for row, and computes in float64 in the
+    # same order as the scalar code so results agree right at the thresholds.
+    landmarks = np.asarray(landmarks, dtype=np.float64)
+    heights = np.asarray(image_heights, dtype=np.float64)
+    n = len(landmarks)
+    if detected is None:
+        detected = np.ones(n, dtype=bool)
+    y, z, visibility = landmarks[:, :, 1], landmarks[:, :, 2], landmarks[:, :, 3]
+    visible = visibility > VISIBILITY_THRESHOLD
+    enough_visible = detected & (visible.sum(axis=1) >= MIN_VISIBLE_LANDMARKS_OVERALL)
+
+    full_idx = _landmark_indices(FULL_BODY_REQUIRED_LANDMARKS)
+    upper_idx = _landmark_indices(UPPER_BODY_REQUIRED_LANDMARKS)
+    full_visible = visible[:, full_idx]
+    with np.errstate(invalid='ignore'):
+        y_px = y[:, full_idx] * heights[:, None]
+        # fmax/fmin skip NaN the way the scalar min()/max() chain does.
+        spread = (np.fmax.reduce(np.where(full_visible, y_px, -np.inf), axis=1)
+                  - np.fmin.reduce(np.where(full_visible, y_px, np.inf), axis=1))
+        spread_ratio = np.divide(spread, heights, out=np.zeros(n), where=heights > 0)
+    is_full = (full_visible.sum(axis=1) >= len(FULL_BODY_REQUIRED_LANDMARKS)) & (heights > 0) & \
+              (spread_ratio >= VERTICAL_SPREAD_THRESHOLD)
+    is_upper = visible[:, upper_idx].sum(axis=1) >= len(UPPER_BODY_REQUIRED_LANDMARKS)
+
+    ls, rs, lh, rh = (lm.value for lm in (LM.LEFT_SHOULDER, LM.RIGHT_SHOULDER, LM.LEFT_HIP, LM.RIGHT_HIP))
+    torso_z = z[:, [ls, rs, lh, rh]]
+    front = (heights > 0) & visible[:, _landmark_indices(FRONT_FACING_CHECK_LANDMARKS)].all(axis=1)
+    with np.errstate(invalid='ignore'):
+        front &= ~(np.abs(y[:, ls] - y[:, rs]) > MAX_Y_DIFF_RATIO_SHOULDERS)
+        front &= ~(np.abs(y[:, lh] - y[:, rh]) > MAX_Y_DIFF_RATIO_HIPS)
+        front &= np.isfinite(torso_z).all(axis=1)
+        front &= ~(np.abs(z[:, ls] - z[:, rs]) > MAX_Z_DIFF_SHOULDERS)
+        front &= ~(np.abs(z[:, lh] - z[:, rh]) > MAX_Z_DIFF_HIPS)
+
+    codes = np.where(enough_visible & is_full, 2, np.where(enough_visible & is_upper, 1, 0))
+    return POSE_TYPES[codes], front & (codes > 0)
+
+
+def classify_store(store):
+    # {url: (pose_type, front_facing)} for every image in a LandmarkStore.
+    rows = store.merged()
+    pose_types, fronts = classify_poses(rows['landmarks'], rows['shapes'][:, 0], rows['detected'])
+    return {url: (str(pose_types[row]), bool(fronts[row])) for row, url in enumerate(rows['urls'])}
+
+
+def _pick_candidate(candidate_results):
+    selected = None
     for res in candidate_results:
         if res['type'] == 'Full' and res['front']:
-            selected_url = res['url']
-            print(f"--> Selected Priority 1: Full Body, Front Facing ({selected_url})")
+            selected = res
+            print(f"--> Selected Priority 1: Full Body, Front Facing ({selected['url']})")
             break
-    if not selected_url:
+    if not selected:
         for res in candidate_results:
             if res['type'] == 'Full':
-                selected_url = res['url']
-                print(f"--> Selected Priority 2: Full Body, Any Orientation ({selected_url})")
+                selected = res
+                print(f"--> Selected Priority 2: Full Body, Any Orientation ({selected['url']})")
                 break
-    if not selected_url:
+    if not selected:
         for res in candidate_results:
             if res['type'] == 'Upper' and res['front']:
-                selected_url = res['url']
-                print(f"--> Selected Priority 3: Upper Body, Front Facing ({selected_url})")
+                selected = res
+                print(f"--> Selected Priority 3: Upper Body, Front Facing ({selected['url']})")
                 break
-    if not selected_url:
+    if not selected:
         for res in candidate_results:
             if res['type'] == 'Upper':
-                selected_url = res['url']
-                print(f"--> Selected Priority 4: Upper Body, Any Orientation ({selected_url})")
+                selected = res
+                print(f"--> Selected Priority 4: Upper Body, Any Orientation ({selected['url']})")
+                break
+
+    if not selected:
+        return None, None
+    return selected['url'], selected['image']
+
+
+def select_model_image(candidate_urls, candidate_images):
+    # Runs pose detection over the decoded candidates and applies the priority
+    # order; returns the chosen URL and its decoded image, or (None, None).
+    candidate_results = []
+
+    for img_url, image_np in zip(candidate_urls, candidate_images):
+        results, _, img_shape = _process_image(image_np, img_url)
+        if results and img_shape:
+            pose_type, front_facing = check_pose_type(results, img_shape)
+            if pose_type != 'None':
+                print(f"  URL: {img_url} -> Type: {pose_type}, Front: {front_facing}")
+                candidate_results.append({'url': img_url, 'type': pose_type, 'front': front_facing,
+                                          'image': image_np})
+
+    return _pick_candidate(candidate_results)
+
+
+def _downscale(image_np, max_side=CASCADE_SCREEN_MAX_SIDE):
+    height, width = image_np.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return image_np
+    return cv2.resize(image_np, (max(1, round(width * scale)), max(1, round(height * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def is_borderline(results):
+    # True when the screening result sits close enough to a decision threshold
+    # that the lite model's landmark noise could flip the pose type.
+    landmarks = results.pose_landmarks.landmark
+    for lm_enum in CASCADE_CHECK_LANDMARKS:
+        if abs(landmarks[lm_enum.value].visibility - VISIBILITY_THRESHOLD) < CASCADE_VISIBILITY_MARGIN:
+            return True
+    full_body_y = [landmarks[lm_enum.value].y for lm_enum in FULL_BODY_REQUIRED_LANDMARKS
+                   if landmarks[lm_enum.value].visibility > VISIBILITY_THRESHOLD]
+    if len(full_body_y) == len(FULL_BODY_REQUIRED_LANDMARKS):
+        spread = max(full_body_y) - min(full_body_y)
+        if abs(spread - VERTICAL_SPREAD_THRESHOLD) < CASCADE_SPREAD_MARGIN:
+            return True
+    return False
+
+
+def select_model_image_cascade(candidate_urls, candidate_images):
+    # Cheaper variant of select_model_image. Each candidate is first screened on
+    # a downscaled copy with the lite model, in listing order (model_image_url
+    # first, then additional_images). A screened Priority 1 is re-checked with
+    # the full model, and screening stops at the first one it confirms.
+    # Borderline screens are rerun with the full model, and images where the
+    # lite model found nobody are retried only if nothing else qualified. The
+    # pick can still differ from select_model_image: a confident lite verdict
+    # on another candidate is kept as-is, even where the full model would have
+    # ranked that image higher.
+    candidate_results, borderline, undetected = [], [], []
+    escalated = 0
+
+    def _record(position, img_url, image_np, results, img_shape, stage):
+        pose_type, front_facing = check_pose_type(results, img_shape)
+        if pose_type != 'None':
+            print(f"  URL: {img_url} -> Type: {pose_type}, Front: {front_facing} ({stage})")
+            candidate_results.append({'url': img_url, 'type': pose_type, 'front': front_facing,
+                                      'image': image_np, 'position': position})
+        return pose_type == 'Full' and front_facing
+
+    found_priority_one = False
+    for position, (img_url, image_np) in enumerate(zip(candidate_urls, candidate_images)):
+        if image_np is None:
+            continue
+        screen_image = _downscale(image_np)
+        results, _, img_shape = _process_image(screen_image, img_url, CASCADE_SCREEN_COMPLEXITY)
+        if not results or not results.pose_landmarks:
+            undetected.append((position, img_url, image_np))
+        elif is_borderline(results):
+            borderline.append((position, img_url, image_np))
+        else:
+            pose_type, front_facing = check_pose_type(results, img_shape)
+            stage = 'screened'
+            if pose_type == 'Full' and front_facing:
+                escalated += 1
+                results, _, img_shape = _process_image(image_np, img_url)
+                stage = 'full model check'
+            if results and img_shape and _record(position, img_url, image_np, results, img_shape, stage):
+                found_priority_one = True
                 break
 
-    if selected_url:
-        df.loc[index, 'new_model_image_url'] = selected_url
-        print(f"Final selection for product {row.get('product_id', 'N/A')}: {selected_url}")
+    for stage in (borderline, undetected):
+        if found_priority_one or (stage is undetected and candidate_results):
+            break
+        for position, img_url, image_np in stage:
+            escalated += 1
+            results, _, img_shape = _process_image(image_np, img_url)
+            if results and img_shape and _record(position, img_url, image_np, results, img_shape, 'full model'):
+                found_priority_one = True
+                break
+
+    print(f"  Cascade: full model on {escalated} of {sum(image is not None for image in candidate_images)} images")
+    candidate_results.sort(key=lambda res: res['position'])
+    return _pick_candidate(candidate_results)
+
+
+def select_model_image_offline(candidate_urls, candidate_images, verdicts):
+    # Re-runs the selection from classify_store verdicts: no download, no
+    # inference. Candidates missing from the store are skipped.
+    candidate_results = []
+    for img_url in candidate_urls:
+        if img_url not in verdicts:
+            continue
+        pose_type, front_facing = verdicts[img_url]
+        if pose_type != 'None':
+            print(f"  URL: {img_url} -> Type: {pose_type}, Front: {front_facing}")
+            candidate_results.append({'url': img_url, 'type': pose_type, 'front': front_facing, 'image': None})
+    return _pick_candidate(candidate_results)
+
+
+def select_model_image_urls(products, total_rows=None, cascade=False, offline_store=None):
+    # products: (position, product_id, candidate_urls) tuples. Runs in the
+    # calling process; the parallel mode calls it once per shard in a worker.
+    # Returns the selected URLs and the full-model landmarks computed on the way.
+    candidate_lists = [candidate_urls for _, _, candidate_urls in products]
+    if offline_store is None and _landmark_store is not None:
+        # A long-lived worker's view of the store predates the chunks saved
+        # since the pool started.
+        _landmark_store.refresh()
+    if offline_store is not None:
+        image_batches = ([None] * len(candidate_urls) for candidate_urls in candidate_lists)
+        select = partial(select_model_image_offline, verdicts=classify_store(offline_store))
     else:
-        print(f"No suitable model image found meeting criteria for product {row.get('product_id', 'N/A')}. Leaving blank.")
+        image_batches = default_fetcher().fetch_batches(candidate_lists, fetch_fn=_fetch_image)
+        select = select_model_image_cascade if cascade else select_model_image
+    selected_urls = []
+    for (position, product_id, candidate_urls), candidate_images in zip(products, image_batches):
+        progress = f"{position + 1}/{total_rows}" if total_rows else f"{position + 1}"
+        print(f"\nProcessing Product {progress}: {product_id}")
+        print(f"Found {len(candidate_urls)} unique candidate URLs.")
+        selected_url, _ = select(candidate_urls, candidate_images)
+        if selected_url:
+            print(f"Final selection for product {product_id}: {selected_url}")
+        else:
+            print(f"No suitable model image found meeting criteria for product {product_id}. Leaving blank.")
+        selected_urls.append(selected_url)
+    return selected_urls, drain_observations()
+
+def pose_worker_pool(workers=POSE_WORKERS, landmark_store_dir=None, thresholds=None, fetcher_options=None):
+    # Spawned pose workers, each with its own Pose graph, image fetcher and
+    # read-only view of the landmark store, refreshed before every shard.
+    # Build it once per run and pass it to every select_model_image_urls_parallel
+    # call (one per chunk with --chunk-size) so interpreter start-up and graph
+    # builds are paid once. None for workers <= 1.
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_worker,
+                               initargs=(landmark_store_dir, thresholds or {}, fetcher_options or {}))
+
+
+def select_model_image_urls_parallel(products, pool=None, shard_size=SHARD_SIZE, cascade=False, total_rows=None):
+    # Shards of products go to the pose_worker_pool; pool.map hands shard
+    # results back in input order. Without a pool everything runs here.
+    if pool is None:
+        return select_model_image_urls(products, total_rows, cascade=cascade)
+    select_shard = partial(select_model_image_urls, total_rows=total_rows, cascade=cascade)
+    shards = [products[i:i + shard_size] for i in range(0, len(products), shard_size)]
+    selected_urls, observations = [], []
+    for shard_urls, shard_observations in pool.map(select_shard, shards):
+        selected_urls.extend(shard_urls)
+        observations.extend(shard_observations)
+    return selected_urls, observations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Select a front-facing model image for every product.")
+    parser.add_argument('--workers', type=int, default=POSE_WORKERS, help="pose detection processes")
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help="products per worker task")
+    parser.add_argument('--cascade', action='store_true',
+                        help="screen candidates with the lite model and stop at the first Priority 1 image")
+    parser.add_argument('--landmarks', default=LANDMARK_STORE_DIR, help="pose landmark store directory")
+    parser.add_argument('--offline', action='store_true',
+                        help="re-run the selection from stored landmarks without downloading or inference")
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help=f"override a threshold, one of {', '.join(TUNABLE_THRESHOLDS)} (repeatable)")
+    parser.add_argument('--rendition-width', type=int, default=ANALYSIS_WIDTH,
+                        help="fetch CDN renditions this many px wide for analysis (0 = original images)")
+    parser.add_argument('--chunk-size', type=int, default=0,
+                        help="stream the input this many rows at a time with checkpoint/resume (0 = whole file)")
+    args = parser.parse_args()
+    fetcher_options = {'rendition_width': args.rendition_width}
+    configure_default_fetcher(**fetcher_options)
 
+    try:
+        thresholds = dict(item.split('=', 1) for item in args.set)
+        apply_thresholds(thresholds)
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit()
+
+    landmark_store = LandmarkStore(args.landmarks)
+    pool = None if args.offline else pose_worker_pool(args.workers, args.landmarks, thresholds, fetcher_options)
+
+    def select_for_rows(df, total_rows=None):
+        products = [(index, row.get('product_id', 'N/A'), _candidate_urls(row)) for index, row in df.iterrows()]
+        if args.offline:
+            print(f"Re-selecting model images for {len(products)} products from {len(landmark_store)} stored poses.")
+            selected_urls, _ = select_model_image_urls(products, total_rows, offline_store=landmark_store)
+        else:
+            print(f"Selecting model images for {len(products)} products with {max(args.workers, 1)} pose worker(s).")
+            use_landmark_store(landmark_store)
+            selected_urls, observations = select_model_image_urls_parallel(products, pool, args.shard_size,
+                                                                           args.cascade, total_rows)
+            for image_url, landmarks, image_shape in observations:
+                landmark_store.put(image_url, landmarks, image_shape)
+            saved = landmark_store.save()
+            print(f"Stored landmarks for {saved} new images in {args.landmarks} ({len(landmark_store)} total).")
+
+        df['new_model_image_url'] = selected_urls
+        return df
+
+    if args.chunk_size > 0:
+        try:
+            processed = process_csv_in_chunks(INPUT_CSV_PATH, OUTPUT_CSV_PATH, select_for_rows, args.chunk_size,
+                                              na_rep='')
+        except FileNotFoundError:
+            print(f"Error: Input file not found at {INPUT_CSV_PATH}")
+            exit()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        close_pose_detector()
+        default_fetcher().close()
+        print(f"\nProcessing complete. {processed} products added to {OUTPUT_CSV_PATH}")
+        exit()
 
-pose_detector.close()
+    try:
+        df = pd.read_csv(INPUT_CSV_PATH)
+        print(f"Loaded {len(df)} rows from {INPUT_CSV_PATH}")
+    except FileNotFoundError:
+        print(f"Error: Input file not found at {INPUT_CSV_PATH}")
+        exit()
+    except Exception as e:
+        print(f"Error reading CSV: {e}")
+        exit()
 
-try:
-    df.to_csv(OUTPUT_CSV_PATH, index=False, na_rep='')
-    print(f"\nProcessing complete. Front-facing prioritized data saved to {OUTPUT_CSV_PATH}")
-except Exception as e:
-    print(f"Error saving CSV: {e}")
+    try:
+        df = select_for_rows(df, len(df))
+    finally:
+        if pool is not None:
+            pool.shutdown()
 
+
+    close_pose_detector()
+    default_fetcher().close()
+
+    try:
+        df.to_csv(OUTPUT_CSV_PATH, index=False, na_rep='')
+        print(f"\nProcessing complete. Front-facing prioritized data saved to {OUTPUT_CSV_PATH}")
+    except Exception as e:
+        print(f"Error saving CSV: {e}")
@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+
+from cache_store import SizeBoundedCache, evict_least_recent, sharded_entries, write_atomic
+
+DEFAULT_CACHE_DIR = './data/page_cache'
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+DEFAULT_TTL = 7 * 24 * 3600
+META_SUFFIX = '.json'
+BODY_SUFFIX = '.html.gz'
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+class PageCache(SizeBoundedCache):
+    # Product pages keyed by URL: <key>.html.gz holds the gzip-compressed body,
+    # <key>.json the ETag / Last-Modified validators, the fetch time and the
+    # search_text gender.py extracted from the page, tagged with the version of
+    # the extractor that produced it. Entries younger than `ttl` seconds are
+    # used without a request; older ones are revalidated with a conditional
+    # GET, and a 304 only refreshes the fetch time. Total size is bounded; the
+    # least recently used pages go first.
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        super().__init__(max_bytes)
+        self.root = root
+        self.ttl = ttl
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        self._bytes = sum(entry.stat().st_size for entry in self._entries())
+
+    def _path(self, url, suffix):
+        key = url_key(url)
+        return os.path.join(self.root, key[:2], key + suffix)
+
+    def _entries(self):
+        return sharded_entries(self.root)
+
+    def _write_meta(self, url, meta):
+        # Returns the change in bytes on disk; the size cap counts bytes, not
+        # characters, so the JSON is encoded before it is measured.
+        meta_path = self._path(url, META_SUFFIX)
+        previous = os.path.getsize(meta_path) if os.path.exists(meta_path) else 0
+        data = json.dumps(meta).encode('utf-8')
+        write_atomic(meta_path, data, 'wb')
+        return len(data) - previous
+
+    def get(self, url):
+        # The metadata dict of a cached page (validators, fetched_at,
+        # search_text), or None. Fresh entries count as hits.
+        meta_path = self._path(url, META_SUFFIX)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._count('misses')
+            return None
+        if meta.get('url') != url:
+            self._count('misses')
+            return None
+        os.utime(meta_path)
+        if self.is_fresh(meta):
+            self._count('hits')
+        return meta
+
+    def is_fresh(self, meta):
+        return time.time() - meta.get('fetched_at', 0) < self.ttl
+
+    def validators(self, meta):
+        # Request headers for a conditional GET of a stale entry.
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def get_body(self, url):
+        try:
+            with gzip.open(self._path(url, BODY_SUFFIX), 'rb') as f:
+                return f.read()
+        except (FileNotFoundError, OSError, EOFError):
+            return None
+
+    def put(self, url, body, headers, search_text, text_version=None):
+        compressed = gzip.compress(body)
+        body_path = self._path(url, BODY_SUFFIX)
+        previous = os.path.getsize(body_path) if os.path.exists(body_path) else 0
+        write_atomic(body_path, compressed, 'wb')
+        delta = len(compressed) - previous
+        delta += self._write_meta(url, {'url': url, 'etag': headers.get('ETag'),
+                                        'last_modified': headers.get('Last-Modified'),
+                                        'content_type': headers.get('Content-Type'), 'fetched_at': time.time(),
+                                        'size': len(body), 'search_text': search_text,
+                                        'text_version': text_version})
+        if self._grow(delta):
+            self.evict()
+
+    def refresh(self, url, meta):
+        # A 304 confirmed the cached page; restart its TTL.
+        self._grow(self._write_meta(url, dict(meta, fetched_at=time.time())))
+        self._count('revalidated')
+
+    def update_search_text(self, url, meta, search_text, text_version):
+        # Text re-extracted from the stored body; the fetch time is unchanged.
+        meta = dict(meta, search_text=search_text, text_version=text_version)
+        self._grow(self._write_meta(url, meta))
+        return meta
+
+    def evict(self):
+        # Trim back under max_bytes, least recently read URL first; a page's
+        # body and metadata go together.
+        pages = {}
+        for entry in self._entries():
+            pages.setdefault(entry.name.split('.', 1)[0], []).append(entry)
+        self._set_size(evict_least_recent(pages, self.max_bytes))
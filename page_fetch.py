@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+from http_session import LazyDefault, ThreadSessions
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9'
+}
+TIMEOUT = 25
+# Politeness: requests per second allowed against any one host, how many may
+# go out back to back after an idle spell, and how many are in flight at once.
+RATE_PER_HOST = 1.0
+BURST = 2
+MAX_WORKERS = 8
+MAX_RETRIES = 3
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    # Refills at `rate` tokens per second up to `capacity`. acquire() reserves
+    # a token under the lock and sleeps outside it, so waiting threads queue
+    # up at evenly spaced start times instead of all waking at once.
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def _retry_after(response):
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class PageFetcher:
+    # Product-page downloads for gender.py. Throughput is set by a per-host
+    # token bucket rather than a sleep after every row, with at most
+    # max_workers requests in flight. Timeouts, connection errors and
+    # 429/5xx responses are retried with full-jitter exponential backoff
+    # (a 429's Retry-After wins when longer); every attempt waits for a token.
+
+    def __init__(self, rate_per_host=RATE_PER_HOST, burst=BURST, max_workers=MAX_WORKERS, timeout=TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, headers=None):
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.headers = dict(HEADERS if headers is None else headers)
+        self._sessions = ThreadSessions(self.headers)
+        self._buckets = defaultdict(lambda: TokenBucket(self.rate_per_host, self.burst))
+        self._bucket_lock = threading.Lock()
+        self._executor = None
+
+    def _session(self):
+        return self._sessions.get()
+
+    def _bucket(self, url):
+        with self._bucket_lock:
+            return self._buckets[urlparse(url).netloc]
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def fetch(self, url, headers=None):
+        # The final response once it is not retryable, with raise_for_status()
+        # already applied; the last timeout or connection error propagates
+        # when retries run out.
+        bucket = self._bucket(url)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            try:
+                response = self._session().get(url, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"{type(e).__name__} for {url}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = max(self._backoff(attempt), _retry_after(response) or 0)
+                print(f"HTTP {response.status_code} for {url}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            response.raise_for_status()
+            return response
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='page-fetch')
+        return self._executor
+
+    def submit(self, fn, *args):
+        return self.executor.submit(fn, *args)
+
+    def map(self, fn, urls):
+        # fn(url) on the pool, results in input order.
+        return self.executor.map(fn, urls)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_default = LazyDefault(PageFetcher)
+
+
+def configure_default_fetcher(**options):
+    # PageFetcher keyword arguments for default_fetcher(); call before first use.
+    _default.configure(**options)
+
+
+def default_fetcher():
+    return _default.get()
@@ -0,0 +1,130 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from catalog import GENDER_COLUMN, MODEL_IMAGE_COLUMN, SKIN_COLOR_COLUMN, URL_COLUMN
+from gender import PAGE_CACHE_DIR, get_gender_by_frequency_targeted, infer_local_genders, use_page_cache
+from image_fetch import ANALYSIS_WIDTH, configure_default_fetcher, default_fetcher, url_image_shape
+from landmark_store import LandmarkStore
+from model_image import (LANDMARK_STORE_DIR, _candidate_urls, _fetch_image, close_pose_detector,
+                         drain_observations, select_model_image, select_model_image_cascade, use_landmark_store)
+from page_cache import PageCache
+from page_fetch import default_fetcher as default_page_fetcher
+from skin_color_detector import skin_color_from_image
+
+INPUT_CSV_PATH = './data/pae_dataset.csv'
+OUTPUT_CSV_PATH = './data/myntra_data_enriched.csv'
+SKIN_WORKERS = 4
+PREFETCH_PRODUCTS = 8
+
+
+def _skin_for(selected_url, selected_image):
+    # selected_image may be a rendition; the threshold scales to its size
+    # relative to the full image the URL names.
+    if selected_image is None:
+        return None
+    try:
+        return skin_color_from_image(selected_image, original_shape=url_image_shape(selected_url))
+    except Exception as e:
+        print(f"An unexpected error occurred processing {selected_url}: {e}")
+        return None
+
+
+def enrich_products(df, skin_workers=SKIN_WORKERS, prefetch=PREFETCH_PRODUCTS, cascade=False, landmark_store=None,
+                    catalog_first=False):
+    # One pass over the products in place of model_image.py -> skin_color_detector.py
+    # -> gender.py. Three things overlap: candidate downloads on the fetcher pool,
+    # product-page gender lookups on the rate-limited page fetcher pool, and skin
+    # extraction on a thread pool. Pose detection stays in this thread on the one
+    # MediaPipe graph, and the image it selects is handed to skin extraction
+    # as-is, without another download or decode. With catalog_first, product
+    # pages are only fetched for rows gender.infer_local_genders leaves open.
+    records = df.to_dict(orient='records')
+    fetcher = default_fetcher()
+    candidate_lists = [_candidate_urls(record) for record in records]
+    select = select_model_image_cascade if cascade else select_model_image
+
+    page_fetcher = default_page_fetcher()
+    with ThreadPoolExecutor(max_workers=skin_workers, thread_name_prefix='skin') as skin_pool:
+        local_genders = infer_local_genders(df).tolist() if catalog_first else [None] * len(records)
+        gender_futures = [page_fetcher.submit(get_gender_by_frequency_targeted, record.get(URL_COLUMN), page_fetcher)
+                          if local_gender is None else None
+                          for record, local_gender in zip(records, local_genders)]
+
+        selected_urls, skin_futures = [], []
+        image_batches = fetcher.fetch_batches(candidate_lists, prefetch, fetch_fn=_fetch_image)
+        total_rows = len(records)
+        for i, (record, candidate_urls, candidate_images) in enumerate(zip(records, candidate_lists, image_batches)):
+            print(f"\nProcessing Product {i + 1}/{total_rows}: {record.get('product_id', 'N/A')}")
+            print(f"Found {len(candidate_urls)} unique candidate URLs.")
+            selected_url, selected_image = select(candidate_urls, candidate_images)
+            if selected_url:
+                print(f"Final selection for product {record.get('product_id', 'N/A')}: {selected_url}")
+            else:
+                print(f"No suitable model image found meeting criteria for product {record.get('product_id', 'N/A')}. Leaving blank.")
+            for image_url, landmarks, image_shape in drain_observations():
+                if landmark_store is not None:
+                    landmark_store.put(image_url, landmarks, image_shape)
+            selected_urls.append(selected_url)
+            skin_futures.append(skin_pool.submit(_skin_for, selected_url, selected_image))
+
+        skin_colors = []
+        for selected_url, future in zip(selected_urls, skin_futures):
+            dominant_color = future.result()
+            if not selected_url:
+                skin_colors.append("Invalid URL")
+            else:
+                skin_colors.append(dominant_color or "Not Detected")
+        genders = [local_gender if future is None else future.result()
+                   for local_gender, future in zip(local_genders, gender_futures)]
+
+    enriched = df.copy()
+    enriched[MODEL_IMAGE_COLUMN] = selected_urls
+    enriched[SKIN_COLOR_COLUMN] = skin_colors
+    enriched[GENDER_COLUMN] = genders
+    return enriched
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Select model images, detect skin color and gender in one pass.")
+    parser.add_argument('--input', default=INPUT_CSV_PATH)
+    parser.add_argument('--output', default=OUTPUT_CSV_PATH)
+    parser.add_argument('--skin-workers', type=int, default=SKIN_WORKERS)
+    parser.add_argument('--prefetch', type=int, default=PREFETCH_PRODUCTS, help="products whose images download ahead")
+    parser.add_argument('--cascade', action='store_true', help="cascaded pose screening (see model_image.py)")
+    parser.add_argument('--catalog-first', action='store_true',
+                        help="gender from the URL slug, name and description; fetch pages only for unclear rows")
+    parser.add_argument('--landmarks', default=LANDMARK_STORE_DIR, help="pose landmark store directory")
+    parser.add_argument('--rendition-width', type=int, default=ANALYSIS_WIDTH,
+                        help="fetch CDN renditions this many px wide for analysis (0 = original images)")
+    args = parser.parse_args()
+    configure_default_fetcher(rendition_width=args.rendition_width)
+
+    try:
+        df = pd.read_csv(args.input)
+        print(f"Loaded {len(df)} rows from {args.input}")
+    except FileNotFoundError:
+        print(f"Error: Input file not found at {args.input}")
+        exit()
+    except Exception as e:
+        print(f"Error reading CSV: {e}")
+        exit()
+
+    start = time.perf_counter()
+    landmark_store = LandmarkStore(args.landmarks)
+    use_landmark_store(landmark_store)
+    use_page_cache(PageCache(PAGE_CACHE_DIR))
+    enriched = enrich_products(df, args.skin_workers, args.prefetch, args.cascade, landmark_store,
+                               args.catalog_first)
+    landmark_store.save()
+    close_pose_detector()
+    default_fetcher().close()
+    default_page_fetcher().close()
+
+    try:
+        enriched.to_csv(args.output, index=False, na_rep='')
+        print(f"\nProcessing complete in {time.perf_counter() - start:.1f}s. Enriched data saved to {args.output}")
+    except Exception as e:
+        print(f"Error saving CSV: {e}")
@@ -1,147 +1,296 @@
+import argparse
 import os
 import re
-import time
 import requests
 import csv
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from image_cache import ImageCache, decodes_as_image
 
 CHROMEDRIVER_PATH = r"C:\chromedriver-win64\chromedriver.exe"
 DATA_DIR = "data"
 IMAGES_DIR = os.path.join(DATA_DIR, "images")
-if not os.path.exists(IMAGES_DIR):
-    os.makedirs(IMAGES_DIR)
-
 CSV_FILE = os.path.join(DATA_DIR, "products.csv")
+CSV_HEADER = [
+    "product_id", "product_name", "category", "price", "product_url",
+    "description", "front_image_url", "model_image_url", "additional_images"
+]
 
 SEARCH_QUERY = "oversized tshirts men"
-service = Service(CHROMEDRIVER_PATH)
-driver = webdriver.Chrome(service=service)
+HOME_URL = "https://www.myntra.com/"
+# Explicit waits replace fixed sleeps: each page is used as soon as the
+# element it needs is present, and given up on after WAIT_TIMEOUT seconds.
+WAIT_TIMEOUT = 15
+IMAGE_WAIT_TIMEOUT = 5
+IMAGE_TIMEOUT = 30
+MAX_PAGES = 1
+WORKERS = 1
 
-write_header = not os.path.exists(CSV_FILE) or os.path.getsize(CSV_FILE) == 0
+image_cache = None
 
-csv_file = open(CSV_FILE, "a", newline="", encoding="utf-8")
-csv_writer = csv.writer(csv_file)
-if write_header:
-    csv_writer.writerow([
-        "product_id", "product_name", "category", "price", "product_url",
-        "description", "front_image_url", "model_image_url", "additional_images"
-    ])
 
 def extract_image_url(style_attr):
     match = re.search(r'url\(["\']?(.*?)["\']?\)', style_attr)
     return match.group(1) if match else None
 
-try:
-    driver.get("https://www.myntra.com/")
-    time.sleep(3)
-    
-    search_box = driver.find_element(By.CSS_SELECTOR, "input.desktop-searchBar")
+
+def make_driver(chromedriver_path=CHROMEDRIVER_PATH, headless=False):
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1366,900")
+    return webdriver.Chrome(service=Service(chromedriver_path), options=options)
+
+
+def wait_for(driver, condition, timeout=WAIT_TIMEOUT):
+    # The condition's value, or None on timeout.
+    try:
+        return WebDriverWait(driver, timeout).until(condition)
+    except TimeoutException:
+        return None
+
+
+def _grid_images_loaded(driver):
+    # The image grid fills its background-image styles after the title renders.
+    image_divs = driver.find_elements(By.CSS_SELECTOR, ".image-grid-container.common-clearfix .image-grid-image")
+    if image_divs and all(extract_image_url(div.get_attribute("style") or "") for div in image_divs):
+        return image_divs
+    return False
+
+
+def search_product_links(driver, query, max_pages=MAX_PAGES):
+    # Product links for one query in result order, following the results
+    # pagination for up to max_pages pages (0 = every page).
+    driver.get(HOME_URL)
+    search_box = wait_for(driver, EC.element_to_be_clickable((By.CSS_SELECTOR, "input.desktop-searchBar")))
+    if search_box is None:
+        print(f"Search box did not load for query '{query}'.")
+        return []
     search_box.clear()
-    search_box.send_keys(SEARCH_QUERY)
+    search_box.send_keys(query)
     search_box.send_keys(Keys.RETURN)
-    time.sleep(5)
 
-    product_cards = driver.find_elements(By.CSS_SELECTOR, "li.product-base")
     product_links = []
-    for card in product_cards:
-        try:
-            link = card.find_element(By.TAG_NAME, "a").get_attribute("href")
-            if link not in product_links:
-                product_links.append(link)
-        except Exception as e:
-            print("Error fetching product link:", e)
-            continue
+    page = 1
+    while True:
+        if not wait_for(driver, EC.presence_of_all_elements_located((By.CSS_SELECTOR, "li.product-base"))):
+            print(f"No results loaded for '{query}' page {page}.")
+            break
+        for card in driver.find_elements(By.CSS_SELECTOR, "li.product-base"):
+            try:
+                link = card.find_element(By.TAG_NAME, "a").get_attribute("href")
+                if link not in product_links:
+                    product_links.append(link)
+            except Exception as e:
+                print("Error fetching product link:", e)
+                continue
+        print(f"'{query}' page {page}: {len(product_links)} products so far.")
 
-    print(f"Found {len(product_links)} products.")
+        if max_pages and page >= max_pages:
+            break
+        next_links = driver.find_elements(By.CSS_SELECTOR, "li.pagination-next:not(.pagination-disabled) a")
+        next_url = next_links[0].get_attribute("href") if next_links else None
+        if not next_url:
+            break
+        driver.get(next_url)
+        page += 1
+    return product_links
 
-    for idx, link in enumerate(product_links, start=1):
-        print(f"\nProcessing product {idx}: {link}")
-        driver.get(link)
-        time.sleep(3)
-        
-        try:
-            title = driver.find_element(By.CSS_SELECTOR, ".pdp-title").text
-        except Exception:
-            title = "N/A"
-        try:
-            description = driver.find_element(By.CSS_SELECTOR, 
-                                                ".pdp-product-description-content").text
-        except Exception:
-            description = "N/A"
-        try:
-            price = driver.find_element(By.CSS_SELECTOR, ".pdp-price").text
-        except Exception:
-            price = "N/A"
-        
-        category = "Shirt"
-        
-        product_id = f"product_{idx}"
-        
-        try:
-            front_image_element = driver.find_element(By.CSS_SELECTOR, "img.pdp-main-image")
-            front_image_url = front_image_element.get_attribute("src")
-        except Exception:
-            front_image_url = None
-        
-        try:
-            container = driver.find_element(By.CSS_SELECTOR,
-                                              ".image-grid-container.common-clearfix")
-            image_divs = container.find_elements(By.CSS_SELECTOR, ".image-grid-image")
-            if image_divs:
-                model_image_div = image_divs[-1]
-                style_attr = model_image_div.get_attribute("style")
-                model_image_url = extract_image_url(style_attr)
-            else:
-                model_image_url = None
-        except Exception as e:
-            print("Error extracting model image:", e)
+
+def scrape_product(driver, idx, link):
+    print(f"\nProcessing product {idx}: {link}")
+    driver.get(link)
+    if wait_for(driver, EC.presence_of_element_located((By.CSS_SELECTOR, ".pdp-title"))) is None:
+        print(f"Product page did not finish loading: {link}")
+
+    try:
+        title = driver.find_element(By.CSS_SELECTOR, ".pdp-title").text
+    except Exception:
+        title = "N/A"
+    try:
+        description = driver.find_element(By.CSS_SELECTOR,
+                                            ".pdp-product-description-content").text
+    except Exception:
+        description = "N/A"
+    try:
+        price = driver.find_element(By.CSS_SELECTOR, ".pdp-price").text
+    except Exception:
+        price = "N/A"
+
+    category = "Shirt"
+
+    product_id = f"product_{idx}"
+
+    try:
+        front_image_element = driver.find_element(By.CSS_SELECTOR, "img.pdp-main-image")
+        front_image_url = front_image_element.get_attribute("src")
+    except Exception:
+        front_image_url = None
+
+    # Whatever the grid holds once it has loaded or the wait ran out.
+    wait_for(driver, _grid_images_loaded, IMAGE_WAIT_TIMEOUT)
+
+    try:
+        container = driver.find_element(By.CSS_SELECTOR,
+                                          ".image-grid-container.common-clearfix")
+        image_divs = container.find_elements(By.CSS_SELECTOR, ".image-grid-image")
+        if image_divs:
+            model_image_div = image_divs[-1]
+            style_attr = model_image_div.get_attribute("style")
+            model_image_url = extract_image_url(style_attr)
+        else:
             model_image_url = None
-        
+    except Exception as e:
+        print("Error extracting model image:", e)
+        model_image_url = None
+
+    additional_images = []
+    try:
+        container = driver.find_element(By.CSS_SELECTOR,
+                                          ".image-grid-container.common-clearfix")
+        image_divs = container.find_elements(By.CSS_SELECTOR, ".image-grid-image")
+        for div in image_divs:
+            style_attr = div.get_attribute("style")
+            img_url = extract_image_url(style_attr)
+            if img_url:
+                additional_images.append(img_url)
+    except Exception:
         additional_images = []
+
+    for suffix, image_url in (("front", front_image_url), ("model", model_image_url)):
+        if not image_url:
+            continue
         try:
-            container = driver.find_element(By.CSS_SELECTOR,
-                                              ".image-grid-container.common-clearfix")
-            image_divs = container.find_elements(By.CSS_SELECTOR, ".image-grid-image")
-            for div in image_divs:
-                style_attr = div.get_attribute("style")
-                img_url = extract_image_url(style_attr)
-                if img_url:
-                    additional_images.append(img_url)
-        except Exception:
-            additional_images = []
-
-        if front_image_url:
+            response = requests.get(image_url, timeout=IMAGE_TIMEOUT)
+            response.raise_for_status()
+            img_data = response.content
+            if not decodes_as_image(img_data):
+                print(f"Skipping {suffix} image {image_url}: response is not a decodable image.")
+                continue
+            img_filename = os.path.join(IMAGES_DIR, f"{product_id}_{suffix}.jpg")
+            with open(img_filename, "wb") as f:
+                f.write(img_data)
+            if image_cache is not None:
+                image_cache.put(image_url, img_data)
+        except Exception as e:
+            print(f"Failed to download {suffix} image:", e)
+
+    return [
+        product_id,
+        title,
+        category,
+        price,
+        link,
+        description,
+        front_image_url,
+        model_image_url,
+        ";".join(additional_images)
+    ]
+
+
+class DriverPool:
+    # One Chrome driver per worker thread, created on first use (a WebDriver
+    # must not be shared between threads) and all quit by close().
+
+    def __init__(self, workers=WORKERS, chromedriver_path=CHROMEDRIVER_PATH, headless=False):
+        self.workers = workers
+        self.chromedriver_path = chromedriver_path
+        self.headless = headless
+        self._local = threading.local()
+        self._drivers = []
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scraper')
+
+    def driver(self):
+        driver = getattr(self._local, 'driver', None)
+        if driver is None:
+            driver = make_driver(self.chromedriver_path, self.headless)
+            self._local.driver = driver
+            with self._lock:
+                self._drivers.append(driver)
+        return driver
+
+    def close(self):
+        self.executor.shutdown()
+        for driver in self._drivers:
             try:
-                img_data = requests.get(front_image_url).content
-                img_filename = os.path.join(IMAGES_DIR, f"{product_id}_front.jpg")
-                with open(img_filename, "wb") as f:
-                    f.write(img_data)
-            except Exception as e:
-                print("Failed to download front image:", e)
+                driver.quit()
+            except WebDriverException:
+                pass
+        self._drivers = []
 
-        if model_image_url:
+
+def scrape(queries, csv_writer, workers=WORKERS, max_pages=MAX_PAGES, chromedriver_path=CHROMEDRIVER_PATH,
+           headless=False):
+    # Searches every query on the driver pool, drops links already found by
+    # an earlier query, then splits the links round-robin into one shard per
+    # worker. Rows are written as soon as each product is scraped, so with
+    # more than one worker they arrive out of product_id order.
+    pool = DriverPool(workers, chromedriver_path, headless)
+    write_lock = threading.Lock()
+
+    def search(query):
+        try:
+            return search_product_links(pool.driver(), query, max_pages)
+        except WebDriverException as e:
+            print(f"Search failed for '{query}': {e}")
+            return []
+
+    def scrape_shard(shard):
+        written = 0
+        for idx, link in shard:
             try:
-                img_data = requests.get(model_image_url).content
-                img_filename = os.path.join(IMAGES_DIR, f"{product_id}_model.jpg")
-                with open(img_filename, "wb") as f:
-                    f.write(img_data)
-            except Exception as e:
-                print("Failed to download model image:", e)
-
-        csv_writer.writerow([
-            product_id,
-            title,
-            category,
-            price,
-            link,
-            description,
-            front_image_url,
-            model_image_url,
-            ";".join(additional_images)
-        ])
-finally:
-    csv_file.close()
-    driver.quit()
+                row = scrape_product(pool.driver(), idx, link)
+            except WebDriverException as e:
+                print(f"Failed to scrape {link}: {e}")
+                continue
+            with write_lock:
+                csv_writer.writerow(row)
+            written += 1
+        return written
+
+    try:
+        product_links = []
+        for links in pool.executor.map(search, queries):
+            product_links.extend(link for link in links if link not in product_links)
+        print(f"Found {len(product_links)} products.")
+
+        indexed_links = list(enumerate(product_links, start=1))
+        shards = [indexed_links[i::workers] for i in range(workers)]
+        return sum(pool.executor.map(scrape_shard, [shard for shard in shards if shard]))
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape Myntra search results into data/products.csv.")
+    parser.add_argument('--queries', nargs='+', default=[SEARCH_QUERY], help="search queries to scrape")
+    parser.add_argument('--workers', type=int, default=WORKERS, help="Chrome drivers scraping in parallel")
+    parser.add_argument('--headless', action='store_true', help="run Chrome without a window")
+    parser.add_argument('--max-pages', type=int, default=MAX_PAGES, help="result pages per query (0 = all)")
+    parser.add_argument('--chromedriver', default=CHROMEDRIVER_PATH)
+    args = parser.parse_args()
+
+    if not os.path.exists(IMAGES_DIR):
+        os.makedirs(IMAGES_DIR)
+    image_cache = ImageCache()
+
+    write_header = not os.path.exists(CSV_FILE) or os.path.getsize(CSV_FILE) == 0
+    csv_file = open(CSV_FILE, "a", newline="", encoding="utf-8")
+    csv_writer = csv.writer(csv_file)
+    if write_header:
+        csv_writer.writerow(CSV_HEADER)
+
+    try:
+        count = scrape(args.queries, csv_writer, max(1, args.workers), args.max_pages, args.chromedriver,
+                       args.headless)
+        print(f"\nScraped {count} products into {CSV_FILE}")
+    finally:
+        csv_file.close()
@@ -0,0 +1,248 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pandas as pd
+
+from catalog import DISTANCE_COLUMN, METRICS, PRODUCT_ID_COLUMN
+from skin_cache import MISS, image_key
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+MAX_TOP_N = 100
+
+
+class RecommendationService:
+    # Holds the warm catalog and the skin-detection worker pool shared by every
+    # request thread of the HTTP server. Ranking and catalog updates share one
+    # lock; skin detection, the expensive part, runs outside it. Workers are
+    # spawned rather than forked: a fork from a request thread could copy a
+    # lock another thread holds (stdout, catalog_lock) and hang the child.
+    # skin_color_fn(image_bytes) returns (rgb or None, cacheable); results of
+    # transient failures are not cached.
+
+    def __init__(self, catalog, skin_color_fn, workers=None, default_top_n=5, default_metric='rgb', cache=None):
+        self.catalog = catalog
+        self.skin_color_fn = skin_color_fn
+        self.cache = cache
+        self.catalog_lock = threading.Lock()
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self.default_top_n = default_top_n
+        self.default_metric = default_metric
+
+    def warm(self):
+        # Starts the worker processes now instead of inside the first request.
+        self.pool.submit(os.getpid).result()
+
+    def skin_color(self, image_bytes):
+        # Checked here rather than in the workers so repeat uploads never leave
+        # the request thread.
+        if self.cache is None:
+            return self.pool.submit(self.skin_color_fn, image_bytes).result()[0], False
+        key = image_key(image_bytes)
+        rgb = self.cache.get(key)
+        if rgb is not MISS:
+            return rgb, True
+        rgb, cacheable = self.pool.submit(self.skin_color_fn, image_bytes).result()
+        if cacheable:
+            self.cache.put(key, rgb)
+        return rgb, False
+
+    def recommend(self, image_bytes, gender, top_n=None, metric=None, category=None, min_price=None, max_price=None):
+        timings = {}
+        start = time.perf_counter()
+        user_skin_color, cache_hit = self.skin_color(image_bytes)
+        timings['skin_ms'] = (time.perf_counter() - start) * 1000
+        timings['skin_cache_hit'] = cache_hit
+        if user_skin_color is None:
+            return None, timings
+
+        rank_start = time.perf_counter()
+        with self.catalog_lock:
+            recommendations = self.catalog.recommend(user_skin_color, gender, top_n or self.default_top_n,
+                                                     metric or self.default_metric, category, min_price, max_price)
+        timings['rank_ms'] = (time.perf_counter() - rank_start) * 1000
+        return {
+            'gender': gender,
+            'skin_color_rgb': [int(c) for c in user_skin_color],
+            'recommendations': [
+                {**row, DISTANCE_COLUMN: float(row[DISTANCE_COLUMN])}
+                for row in recommendations.to_dict(orient='records')
+            ],
+        }, timings
+
+    def apply_delta(self, delta):
+        start = time.perf_counter()
+        with self.catalog_lock:
+            summary = self.catalog.apply_delta(delta)
+            summary['products'] = len(self.catalog)
+        summary['update_ms'] = (time.perf_counter() - start) * 1000
+        return summary
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def _parse_multipart(content_type, body):
+    message = BytesParser(policy=HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body
+    )
+    fields, image_bytes = {}, None
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        if name == 'image':
+            image_bytes = part.get_payload(decode=True)
+        elif name:
+            fields[name] = part.get_content().strip()
+    return fields, image_bytes
+
+
+class RecommendationHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def _send_json(self, status, payload, elapsed_ms=None):
+        body = json.dumps(payload).encode('utf-8')
+        self._elapsed_ms = elapsed_ms
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if elapsed_ms is not None:
+            self.send_header('X-Response-Time-ms', f"{elapsed_ms:.1f}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0 or length > MAX_UPLOAD_BYTES:
+            return None
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        with self.service.catalog_lock:
+            catalog = self.service.catalog
+            payload = {'status': 'ok', 'products': len(catalog), 'genders': catalog.genders}
+        self._send_json(200, payload)
+
+    def do_DELETE(self):
+        path = urlparse(self.path).path
+        if not path.startswith('/products/') or len(path) <= len('/products/'):
+            self._send_json(404, {'error': 'Not found'})
+            return
+        product_id = unquote(path[len('/products/'):])
+        summary = self.service.apply_delta(pd.DataFrame({PRODUCT_ID_COLUMN: [product_id], 'op': ['delete']}))
+        self._send_json(200 if summary['deleted'] else 404, summary)
+
+    def _post_products(self):
+        # JSON object or list of objects in the final.csv schema, each with an
+        # optional "op": "upsert" | "delete".
+        body = self._read_body()
+        try:
+            records = json.loads(body) if body else None
+        except ValueError:
+            records = None
+        if isinstance(records, dict):
+            records = [records]
+        if not records or not all(isinstance(r, dict) and r.get(PRODUCT_ID_COLUMN) for r in records):
+            self._send_json(400, {'error': f"Expected a JSON product or list of products with '{PRODUCT_ID_COLUMN}'"})
+            return
+        delta = pd.DataFrame(records)
+        delta[PRODUCT_ID_COLUMN] = delta[PRODUCT_ID_COLUMN].astype(str)
+        self._send_json(200, self.service.apply_delta(delta))
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path == '/products':
+            self._post_products()
+            return
+        if url.path != '/recommend':
+            self._send_json(404, {'error': 'Not found'})
+            return
+
+        fields = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        body = self._read_body()
+        if body is None:
+            self._send_json(413 if int(self.headers.get('Content-Length') or 0) else 400,
+                            {'error': f'Image upload required (max {MAX_UPLOAD_BYTES} bytes)'})
+            return
+
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/form-data'):
+            form_fields, image_bytes = _parse_multipart(content_type, body)
+            fields.update(form_fields)
+        else:
+            image_bytes = body
+        if not image_bytes:
+            self._send_json(400, {'error': "Missing 'image' upload"})
+            return
+
+        gender = fields.get('gender', '').strip()
+        with self.service.catalog_lock:
+            available = self.service.catalog.partition_size(gender) > 0
+            genders = self.service.catalog.genders
+        if not available:
+            self._send_json(400, {'error': f"Gender '{gender}' not found", 'available_genders': genders})
+            return
+        metric = fields.get('metric') or None
+        if metric is not None and metric not in METRICS:
+            self._send_json(400, {'error': f"Unknown metric '{metric}', expected one of {list(METRICS)}"})
+            return
+        numbers = {}
+        for name in ('top_n', 'min_price', 'max_price'):
+            try:
+                numbers[name] = int(fields[name]) if fields.get(name) else None
+            except ValueError:
+                self._send_json(400, {'error': f"'{name}' must be an integer"})
+                return
+        top_n = numbers['top_n']
+        if top_n is not None and not 0 < top_n <= MAX_TOP_N:
+            self._send_json(400, {'error': f"'top_n' must be between 1 and {MAX_TOP_N}"})
+            return
+
+        category = [c for c in fields.get('category', '').split(',') if c.strip()] or None
+        payload, timings = self.service.recommend(image_bytes, gender, top_n, metric, category,
+                                                  numbers['min_price'], numbers['max_price'])
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        timings['total_ms'] = elapsed_ms
+        if payload is None:
+            self._send_json(422, {'error': "Could not determine skin color from the image", 'latency': timings},
+                            elapsed_ms)
+            return
+        payload['latency'] = timings
+        self._send_json(200, payload, elapsed_ms)
+
+    def log_message(self, format, *args):
+        print(f"[{self.log_date_time_string()}] {self.address_string()} {format % args}")
+
+    def log_request(self, code='-', size='-'):
+        elapsed_ms = getattr(self, '_elapsed_ms', None)
+        latency = f" {elapsed_ms:.1f}ms" if elapsed_ms is not None else ''
+        self.log_message('"%s" %s%s', self.requestline, str(code), latency)
+
+
+def serve(catalog, skin_color_fn, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, default_top_n=5,
+          default_metric='rgb', cache=None):
+    service = RecommendationService(catalog, skin_color_fn, workers, default_top_n, default_metric, cache)
+    handler = type('BoundRecommendationHandler', (RecommendationHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    service.warm()
+    print(f"Serving recommendations for {len(catalog)} products on http://{host}:{server.server_port} "
+          f"(skin workers: {workers or os.cpu_count()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down.")
+    finally:
+        server.server_close()
+        service.close()
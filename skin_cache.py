@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from cache_store import EVICTION_SLACK, evict_least_recent, sharded_entries, write_atomic
+from color_index import rgb_to_lab
+
+DEFAULT_MEMORY_ENTRIES = 1024
+DEFAULT_DISK_ENTRIES = 100000
+
+# Sentinel distinguishing "never seen" from a cached "no skin detected".
+MISS = object()
+
+
+def image_key(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def config_digest(**settings):
+    # Short digest of the extraction settings a cached tone depends on.
+    encoded = json.dumps({name: np.asarray(value).tolist() if isinstance(value, np.ndarray) else value
+                          for name, value in settings.items()}, sort_keys=True)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+class SkinColorCache:
+    # Two-level cache of extracted skin tones keyed by the sha256 of the image
+    # bytes: a bounded in-memory LRU in front of an optional directory of small
+    # JSON entries, evicted oldest-access-first once it grows past max_disk_entries.
+    # A None tone (image without enough skin) is cached as well, but only when
+    # compute_fn reports it as deterministic. Entries are only valid for the
+    # extraction settings that produced them, so the disk directory is split
+    # per `namespace` (see config_digest).
+
+    def __init__(self, max_entries=DEFAULT_MEMORY_ENTRIES, disk_dir=None, max_disk_entries=DEFAULT_DISK_ENTRIES,
+                 namespace=None):
+        self.max_entries = max_entries
+        self.disk_dir = os.path.join(disk_dir, namespace) if disk_dir and namespace else disk_dir
+        self.namespace = namespace
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._disk_count = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_count = sum(1 for _ in self._disk_entries())
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + '.json')
+
+    def _disk_entries(self):
+        return sharded_entries(self.disk_dir)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get_entry(self, key):
+        with self._lock:
+            entry = self._memory.get(key, MISS)
+            if entry is not MISS:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                os.utime(path)
+            except (FileNotFoundError, ValueError):
+                entry = MISS
+            if entry is not MISS:
+                self._remember(key, entry)
+                with self._lock:
+                    self.hits += 1
+                return entry
+
+        with self._lock:
+            self.misses += 1
+        return MISS
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        if entry is MISS:
+            return MISS
+        return None if entry['rgb'] is None else np.array(entry['rgb'])
+
+    def put(self, key, rgb):
+        if rgb is None:
+            entry = {'rgb': None, 'lab': None}
+        else:
+            entry = {'rgb': [int(c) for c in rgb], 'lab': [round(float(c), 3) for c in rgb_to_lab(rgb)]}
+        self._remember(key, entry)
+        if self.disk_dir:
+            self._write_disk(key, entry)
+
+    def _write_disk(self, key, entry):
+        path = self._disk_path(key)
+        is_new = not os.path.exists(path)
+        write_atomic(path, json.dumps(entry), 'w')
+        if is_new:
+            with self._lock:
+                self._disk_count += 1
+                over_limit = self._disk_count > self.max_disk_entries * (1 + EVICTION_SLACK)
+            if over_limit:
+                self.evict_disk()
+
+    def evict_disk(self):
+        # Trim back to max_disk_entries in one pass; the slack above the limit
+        # keeps this directory scan from running on every insert.
+        remaining = evict_least_recent({entry.path: [entry] for entry in self._disk_entries()},
+                                       self.max_disk_entries, size=lambda stat: 1)
+        with self._lock:
+            self._disk_count = remaining
+
+    def get_or_compute(self, image_bytes, compute_fn):
+        # compute_fn(image_bytes) -> (rgb or None, cacheable); a result from a
+        # transient failure is returned but not stored.
+        key = image_key(image_bytes)
+        rgb = self.get(key)
+        if rgb is MISS:
+            rgb, cacheable = compute_fn(image_bytes)
+            if cacheable:
+                self.put(key, rgb)
+        return rgb
@@ -1,11 +1,15 @@
+import argparse
+from functools import partial
 import pandas as pd
 import requests
 import cv2
 import numpy as np
-import io
-from sklearn.cluster import KMeans
 import os
 from urllib.parse import urlparse
+from skin_tone import get_skin_tone, scaled_min_pixels, skin_region_mask
+from image_fetch import ANALYSIS_WIDTH, configure_default_fetcher, default_fetcher, url_image_shape
+from landmark_store import DEFAULT_STORE_DIR, LandmarkStore
+from checkpoint import process_csv_in_chunks
 
 INPUT_CSV_PATH = './data/myntra_data_updated_front_facing.csv'
 OUTPUT_CSV_PATH = './data/myntra_data_with_skin_color.csv'
@@ -15,8 +19,28 @@ OUTPUT_COLUMN = 'detected_skin_color_rgb'
 LOWER_SKIN_HSV = np.array([0, 40, 50], dtype="uint8")
 UPPER_SKIN_HSV = np.array([25, 150, 255], dtype="uint8")
 MIN_SKIN_PIXELS = 500
+SKIN_TONE_ESTIMATOR = 'mean'
+MAX_SKIN_SAMPLES = None
+LANDMARK_STORE_DIR = DEFAULT_STORE_DIR
+POSE_GUIDED_DECODE_FLAG = cv2.IMREAD_REDUCED_COLOR_2
+
+def skin_color_from_image(image_np, landmarks=None, original_shape=None):
+    # With pose landmarks, only face/neck/forearm pixels are HSV-tested.
+    # MIN_SKIN_PIXELS is scaled to the decoded size relative to original_shape,
+    # the full-size image, so renditions and reduced decodes are judged alike.
+    region_mask = skin_region_mask(image_np.shape, landmarks) if landmarks is not None else None
+    min_pixels = scaled_min_pixels(MIN_SKIN_PIXELS, image_np.shape, original_shape)
+    dominant_rgb = get_skin_tone(image_np, min_pixels, SKIN_TONE_ESTIMATOR,
+                                 LOWER_SKIN_HSV, UPPER_SKIN_HSV, MAX_SKIN_SAMPLES, region_mask)
+    if dominant_rgb is None:
+        return None
+
+    return f"({dominant_rgb[0]}, {dominant_rgb[1]}, {dominant_rgb[2]})"
 
-def get_dominant_skin_color(image_url):
+def get_dominant_skin_color(image_url, pose=None):
+    # pose: (landmarks, image_shape) from the landmark store, or None for the
+    # whole-image path. The full size named in the URL wins over the stored
+    # shape, which may itself be a rendition's.
     if not image_url or not isinstance(image_url, str):
         return None
 
@@ -28,36 +52,18 @@ def get_dominant_skin_color(image_url):
         return None
 
     try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'}
-        response = requests.get(image_url, stream=True, timeout=15, headers=headers)
-        response.raise_for_status()
-
-        image_data = io.BytesIO(response.content)
-        image_np = cv2.imdecode(np.frombuffer(image_data.read(), np.uint8), cv2.IMREAD_COLOR)
+        landmarks, stored_shape = pose if pose else (None, None)
+        original_shape = url_image_shape(image_url) or stored_shape
+        if landmarks is not None:
+            image_np = default_fetcher().fetch_image(image_url, POSE_GUIDED_DECODE_FLAG)
+        else:
+            image_np = default_fetcher().fetch_image(image_url)
 
         if image_np is None:
             print(f"Failed to decode image from URL: {image_url}")
             return None
 
-        hsv_image = cv2.cvtColor(image_np, cv2.COLOR_BGR2HSV)
-
-        skin_mask = cv2.inRange(hsv_image, LOWER_SKIN_HSV, UPPER_SKIN_HSV)
-
-        skin_pixels_img = cv2.bitwise_and(image_np, image_np, mask=skin_mask)
-
-        skin_pixels_bgr = image_np[skin_mask > 0]
-
-        if len(skin_pixels_bgr) < MIN_SKIN_PIXELS:
-            return None
-
-        kmeans = KMeans(n_clusters=1, random_state=0, n_init=10)
-        kmeans.fit(skin_pixels_bgr)
-
-        dominant_bgr = kmeans.cluster_centers_[0].astype(int)
-
-        dominant_rgb = (dominant_bgr[2], dominant_bgr[1], dominant_bgr[0])
-
-        return f"({dominant_rgb[0]}, {dominant_rgb[1]}, {dominant_rgb[2]})"
+        return skin_color_from_image(image_np, landmarks, original_shape)
 
     except requests.exceptions.RequestException as e:
         print(f"Error downloading {image_url}: {e}")
@@ -69,45 +75,89 @@ def get_dominant_skin_color(image_url):
         print(f"An unexpected error occurred processing {image_url}: {e}")
         return None
 
-try:
-    df = pd.read_csv(INPUT_CSV_PATH)
-    print(f"Loaded {len(df)} rows from {INPUT_CSV_PATH}")
-except FileNotFoundError:
-    print(f"Error: Input file not found at {INPUT_CSV_PATH}")
-    exit()
-except Exception as e:
-    print(f"Error reading CSV: {e}")
-    exit()
-
-if IMAGE_COLUMN not in df.columns:
-    print(f"Error: Column '{IMAGE_COLUMN}' not found in the input CSV.")
-    exit()
-
-df[OUTPUT_COLUMN] = None
-
-total_rows = len(df)
-for index, row in df.iterrows():
-    print(f"Processing Skin Color {index + 1}/{total_rows}: Product {row.get('product_id', 'N/A')}")
+def _is_valid_image_url(image_url):
+    return not pd.isna(image_url) and isinstance(image_url, str) and bool(image_url.strip())
 
-    image_url = row[IMAGE_COLUMN]
+def detect_skin_colors(df, landmark_store=None, total_rows=None):
+    if IMAGE_COLUMN not in df.columns:
+        print(f"Error: Column '{IMAGE_COLUMN}' not found in the input CSV.")
+        return None
 
-    if pd.isna(image_url) or not isinstance(image_url, str) or not image_url.strip():
-        print("--> Skipping row due to missing or invalid image URL.")
-        df.loc[index, OUTPUT_COLUMN] = "Invalid URL"
-        continue
+    df[OUTPUT_COLUMN] = None
+
+    # Downloads and skin extraction run on the fetcher's thread pool; results come
+    # back in row order.
+    image_urls = df[IMAGE_COLUMN].tolist()
+    dominant_colors = default_fetcher().map(
+        lambda url: get_dominant_skin_color(url, landmark_store.get(url) if landmark_store else None)
+        if _is_valid_image_url(url) else None, image_urls
+    )
+
+    for (index, row), image_url, dominant_color in zip(df.iterrows(), image_urls, dominant_colors):
+        progress = f"{index + 1}/{total_rows}" if total_rows else f"{index + 1}"
+        print(f"Processing Skin Color {progress}: Product {row.get('product_id', 'N/A')}")
+
+        if not _is_valid_image_url(image_url):
+            print("--> Skipping row due to missing or invalid image URL.")
+            df.loc[index, OUTPUT_COLUMN] = "Invalid URL"
+            continue
+
+        if dominant_color:
+            print(f"--> Detected dominant skin color: {dominant_color}")
+            df.loc[index, OUTPUT_COLUMN] = dominant_color
+        else:
+            print("--> Could not detect dominant skin color.")
+            df.loc[index, OUTPUT_COLUMN] = "Not Detected"
+
+    return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect the model's skin color in every selected image.")
+    parser.add_argument('--pose-guided', action='store_true',
+                        help="decode at half resolution and sample only face/neck/forearm regions from stored poses")
+    parser.add_argument('--landmarks', default=LANDMARK_STORE_DIR, help="pose landmark store directory")
+    parser.add_argument('--rendition-width', type=int, default=ANALYSIS_WIDTH,
+                        help="fetch CDN renditions this many px wide for analysis (0 = original images)")
+    parser.add_argument('--chunk-size', type=int, default=0,
+                        help="stream the input this many rows at a time with checkpoint/resume (0 = whole file)")
+    args = parser.parse_args()
+    configure_default_fetcher(rendition_width=args.rendition_width)
+
+    landmark_store = LandmarkStore(args.landmarks) if args.pose_guided else None
+    if landmark_store is not None:
+        print(f"Pose-guided skin sampling with {len(landmark_store)} stored poses.")
+
+    if args.chunk_size > 0:
+        try:
+            processed = process_csv_in_chunks(INPUT_CSV_PATH, OUTPUT_CSV_PATH,
+                                              partial(detect_skin_colors, landmark_store=landmark_store),
+                                              args.chunk_size)
+        except FileNotFoundError:
+            print(f"Error: Input file not found at {INPUT_CSV_PATH}")
+            exit()
+        default_fetcher().close()
+        if processed is not None:
+            print(f"\nProcessing complete. {processed} products added to {OUTPUT_CSV_PATH}")
+        exit()
 
-    dominant_color = get_dominant_skin_color(image_url)
+    try:
+        df = pd.read_csv(INPUT_CSV_PATH)
+        print(f"Loaded {len(df)} rows from {INPUT_CSV_PATH}")
+    except FileNotFoundError:
+        print(f"Error: Input file not found at {INPUT_CSV_PATH}")
+        exit()
+    except Exception as e:
+        print(f"Error reading CSV: {e}")
+        exit()
 
-    if dominant_color:
-        print(f"--> Detected dominant skin color: {dominant_color}")
-        df.loc[index, OUTPUT_COLUMN] = dominant_color
-    else:
-        print("--> Could not detect dominant skin color.")
-        df.loc[index, OUTPUT_COLUMN] = "Not Detected"
+    df = detect_skin_colors(df, landmark_store, len(df))
+    if df is None:
+        exit()
 
-try:
-    df.to_csv(OUTPUT_CSV_PATH, index=False)
-    print(f"\nProcessing complete. Updated data with skin color saved to {OUTPUT_CSV_PATH}")
-except Exception as e:
-    print(f"Error saving CSV: {e}")
+    default_fetcher().close()
 
+    try:
+        df.to_csv(OUTPUT_CSV_PATH, index=False)
+        print(f"\nProcessing complete. Updated data with skin color saved to {OUTPUT_CSV_PATH}")
+    except Exception as e:
+        print(f"Error saving CSV: {e}")
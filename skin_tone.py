@@ -0,0 +1,127 @@
+import cv2
+import numpy as np
+
+LOWER_SKIN_HSV = np.array([0, 40, 50], dtype="uint8")
+UPPER_SKIN_HSV = np.array([25, 150, 255], dtype="uint8")
+
+ESTIMATORS = ('mean', 'trimmed_mean', 'median', 'histogram')
+DEFAULT_ESTIMATOR = 'mean'
+TRIM_FRACTION = 0.1
+HISTOGRAM_BINS = 16
+
+# Pose-guided sampling: MediaPipe landmark indices and region sizes relative
+# to the shoulder width.
+FACE_LANDMARKS = tuple(range(11))
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+MOUTH_LEFT, MOUTH_RIGHT = 9, 10
+FOREARMS = ((13, 15), (14, 16))
+REGION_VISIBILITY = 0.5
+FACE_PADDING = 0.25
+NECK_LENGTH = 0.6
+NECK_WIDTH = 0.3
+FOREARM_WIDTH = 0.18
+
+
+def skin_region_mask(image_shape, landmarks, min_visibility=REGION_VISIBILITY):
+    # Face, neck and forearm regions drawn from normalized pose landmarks
+    # (33 x (x, y, z, visibility)), so garments and background never reach the
+    # HSV test. Works at any decode scale. None when no region is visible.
+    height, width = image_shape[:2]
+    landmarks = np.asarray(landmarks, dtype=np.float64)
+    points = landmarks[:, :2] * [width, height]
+    visible = landmarks[:, 3] > min_visibility
+    shoulders_visible = visible[LEFT_SHOULDER] and visible[RIGHT_SHOULDER]
+    face = [i for i in FACE_LANDMARKS if visible[i]]
+    if shoulders_visible:
+        scale = np.linalg.norm(points[LEFT_SHOULDER] - points[RIGHT_SHOULDER])
+    elif len(face) > 1:
+        scale = 2 * np.ptp(points[face, 0])
+    else:
+        return None
+
+    mask = np.zeros((height, width), dtype=np.uint8)
+    if face:
+        pad = FACE_PADDING * scale
+        (x0, y0), (x1, y1) = points[face].min(axis=0), points[face].max(axis=0)
+        cv2.rectangle(mask, (int(x0 - pad), int(y0 - 2 * pad)), (int(x1 + pad), int(y1 + pad)), 255, -1)
+        if shoulders_visible and visible[MOUTH_LEFT] and visible[MOUTH_RIGHT]:
+            mouth = (points[MOUTH_LEFT] + points[MOUTH_RIGHT]) / 2
+            shoulders = (points[LEFT_SHOULDER] + points[RIGHT_SHOULDER]) / 2
+            neck_end = mouth + NECK_LENGTH * (shoulders - mouth)
+            cv2.line(mask, tuple(int(c) for c in mouth), tuple(int(c) for c in neck_end), 255,
+                     max(1, int(NECK_WIDTH * scale)))
+    for elbow, wrist in FOREARMS:
+        if visible[elbow] and visible[wrist]:
+            cv2.line(mask, tuple(int(c) for c in points[elbow]), tuple(int(c) for c in points[wrist]), 255,
+                     max(1, int(FOREARM_WIDTH * scale)))
+    return mask if mask.any() else None
+
+
+def extract_skin_pixels(image_bgr, lower_hsv=LOWER_SKIN_HSV, upper_hsv=UPPER_SKIN_HSV, region_mask=None):
+    hsv_image = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV)
+    skin_mask = cv2.inRange(hsv_image, np.asarray(lower_hsv, dtype="uint8"), np.asarray(upper_hsv, dtype="uint8"))
+    if region_mask is not None:
+        skin_mask = cv2.bitwise_and(skin_mask, region_mask)
+    return image_bgr[skin_mask > 0]
+
+
+def sample_pixels(pixels, max_samples, seed=0):
+    if not max_samples or len(pixels) <= max_samples:
+        return pixels
+    rng = np.random.default_rng(seed)
+    return pixels[rng.choice(len(pixels), max_samples, replace=False)]
+
+
+def _trimmed_mean(pixels, trim):
+    n = len(pixels)
+    cut = int(n * trim)
+    if cut == 0 or 2 * cut >= n:
+        return pixels.mean(axis=0)
+    return np.sort(pixels, axis=0)[cut:n - cut].mean(axis=0)
+
+
+def _histogram_mode(pixels, bins):
+    # Most populated cell of a bins^3 color histogram, refined to the mean of
+    # the pixels that fell into it.
+    quantized = (pixels.astype(np.int32) * bins) >> 8
+    cell = (quantized[:, 0] * bins + quantized[:, 1]) * bins + quantized[:, 2]
+    mode_cell = np.argmax(np.bincount(cell, minlength=bins ** 3))
+    return pixels[cell == mode_cell].mean(axis=0)
+
+
+def estimate_skin_color(skin_pixels_bgr, estimator=DEFAULT_ESTIMATOR, trim=TRIM_FRACTION, bins=HISTOGRAM_BINS):
+    # A single-cluster KMeans centroid is the mean, so 'mean' reproduces the
+    # previous KMeans(n_clusters=1) result in closed form.
+    pixels = np.asarray(skin_pixels_bgr).reshape(-1, 3)
+    if estimator == 'mean':
+        dominant_bgr = pixels.mean(axis=0)
+    elif estimator == 'trimmed_mean':
+        dominant_bgr = _trimmed_mean(pixels, trim)
+    elif estimator == 'median':
+        dominant_bgr = np.median(pixels, axis=0)
+    elif estimator == 'histogram':
+        dominant_bgr = _histogram_mode(pixels, bins)
+    else:
+        raise ValueError(f"Unknown skin tone estimator '{estimator}', expected one of {ESTIMATORS}")
+    return dominant_bgr.astype(int)
+
+
+def bgr_to_rgb(bgr):
+    return np.array([bgr[2], bgr[1], bgr[0]])
+
+
+def scaled_min_pixels(min_pixels, image_shape, original_shape=None):
+    # min_pixels is set for full-size images; a reduced decode or a CDN
+    # rendition of original_shape (height, width) needs proportionally fewer.
+    if not original_shape:
+        return min_pixels
+    scale = (image_shape[0] * image_shape[1]) / (original_shape[0] * original_shape[1])
+    return max(1, int(min_pixels * min(scale, 1.0)))
+
+
+def get_skin_tone(image_bgr, min_pixels, estimator=DEFAULT_ESTIMATOR, lower_hsv=LOWER_SKIN_HSV,
+                  upper_hsv=UPPER_SKIN_HSV, max_samples=None, region_mask=None):
+    skin_pixels_bgr = extract_skin_pixels(image_bgr, lower_hsv, upper_hsv, region_mask)
+    if len(skin_pixels_bgr) < min_pixels:
+        return None
+    return bgr_to_rgb(estimate_skin_color(sample_pixels(skin_pixels_bgr, max_samples), estimator))
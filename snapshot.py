@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from catalog import Catalog, OUTPUT_COLUMNS, clean_dataset
+
+SNAPSHOT_VERSION = 4
+SNAPSHOT_SUFFIX = '.snapshot'
+META_FILE = 'meta.json'
+GENERATION_PREFIX = 'gen-'
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class PackedStrings:
+    # Arrow-style string column: one utf-8 byte buffer plus int64 offsets, both
+    # plain .npy files so they can be memory-mapped and sliced without parsing.
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_values(cls, values):
+        encoded = [('' if pd.isna(v) else str(v)).encode('utf-8') for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.data[start:end].tobytes().decode('utf-8')
+
+    def take(self, rows):
+        return np.array([self[i] for i in rows], dtype=object)
+
+
+def default_snapshot_dir(csv_path):
+    return os.path.splitext(csv_path)[0] + SNAPSHOT_SUFFIX
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_stat(csv_path):
+    st = os.stat(csv_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _read_meta(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, META_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_meta(snapshot_dir, meta):
+    tmp_path = os.path.join(snapshot_dir, META_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(snapshot_dir, META_FILE))
+
+
+def _generation_dir(snapshot_dir, generation):
+    return os.path.join(snapshot_dir, f"{GENERATION_PREFIX}{generation}")
+
+
+def _generations(snapshot_dir):
+    return [int(entry.name[len(GENERATION_PREFIX):]) for entry in os.scandir(snapshot_dir)
+            if entry.is_dir() and entry.name.startswith(GENERATION_PREFIX)
+            and entry.name[len(GENERATION_PREFIX):].isdigit()]
+
+
+def _remove_stale_generations(snapshot_dir, current):
+    # Earlier generations, an interrupted build's directory and the flat .npy
+    # files of version 3 snapshots. Files still mapped by a running process
+    # (Windows refuses to delete them) are left for a later build.
+    for entry in os.scandir(snapshot_dir):
+        if entry.is_dir() and entry.name.startswith(GENERATION_PREFIX) and entry.name != os.path.basename(current):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.is_file() and entry.name.endswith('.npy'):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def is_snapshot_fresh(csv_path, snapshot_dir):
+    meta = _read_meta(snapshot_dir)
+    if not meta or meta.get('version') != SNAPSHOT_VERSION:
+        return False
+    source = _source_stat(csv_path)
+    if source['size'] == meta['source']['size'] and source['mtime_ns'] == meta['source']['mtime_ns']:
+        return True
+    # mtime/size moved (copy, touch, checkout): fall back to the content hash
+    # before deciding the snapshot is stale.
+    if source['size'] != meta['source']['size'] or file_sha256(csv_path) != meta['source']['sha256']:
+        return False
+    meta['source'].update(source)
+    _write_meta(snapshot_dir, meta)
+    return True
+
+
+def build_snapshot(csv_path, snapshot_dir=None):
+    snapshot_dir = snapshot_dir or default_snapshot_dir(csv_path)
+    print(f"Building catalog snapshot from {csv_path} into {snapshot_dir}")
+    try:
+        df = pd.read_csv(csv_path)
+    except FileNotFoundError:
+        print(f"Error: Dataset file not found at {csv_path}")
+        return None
+    print(f"Loaded {len(df)} rows.")
+
+    sha256 = file_sha256(csv_path)
+    source = _source_stat(csv_path)
+
+    df = clean_dataset(df)
+    if df is None:
+        return None
+    catalog = Catalog.from_dataframe(df)
+
+    # Arrays go into a new generation directory and meta.json switches to it
+    # last, so .npy files a running process has memory-mapped are never
+    # overwritten, and a crash mid-write leaves the previous snapshot intact.
+    os.makedirs(snapshot_dir, exist_ok=True)
+    generation = max(_generations(snapshot_dir) + [0]) + 1
+    generation_dir = _generation_dir(snapshot_dir, generation)
+    os.makedirs(generation_dir)
+
+    np.save(os.path.join(generation_dir, 'colors.npy'), catalog.colors)
+    np.save(os.path.join(generation_dir, 'gender_codes.npy'), catalog.gender_codes)
+    np.save(os.path.join(generation_dir, 'prices.npy'), catalog.prices)
+    np.save(os.path.join(generation_dir, 'category_codes.npy'), catalog.category_codes)
+    for col in OUTPUT_COLUMNS:
+        packed = PackedStrings.from_values(catalog.columns[col])
+        np.save(os.path.join(generation_dir, f'{col}.data.npy'), packed.data)
+        np.save(os.path.join(generation_dir, f'{col}.offsets.npy'), packed.offsets)
+
+    _write_meta(snapshot_dir, {
+        'version': SNAPSHOT_VERSION,
+        'generation': generation,
+        'rows': len(catalog),
+        'gender_labels': catalog.gender_labels,
+        'category_labels': catalog.category_labels,
+        'columns': OUTPUT_COLUMNS,
+        'source': {'path': os.path.abspath(csv_path), 'sha256': sha256, **source},
+    })
+    _remove_stale_generations(snapshot_dir, generation_dir)
+    print(f"Snapshot written with {len(catalog)} products.")
+    return catalog
+
+
+def load_snapshot(snapshot_dir, mmap_mode='r'):
+    meta = _read_meta(snapshot_dir)
+    if not meta or meta.get('version') != SNAPSHOT_VERSION:
+        return None
+    generation_dir = _generation_dir(snapshot_dir, meta['generation'])
+
+    def _load(name):
+        return np.load(os.path.join(generation_dir, name), mmap_mode=mmap_mode)
+
+    columns = {
+        col: PackedStrings(_load(f'{col}.data.npy'), _load(f'{col}.offsets.npy'))
+        for col in meta['columns']
+    }
+    return Catalog(columns, _load('colors.npy'), _load('gender_codes.npy'), meta['gender_labels'],
+                   _load('prices.npy'), _load('category_codes.npy'), meta['category_labels'])
+
+
+def load_catalog(csv_path, snapshot_dir=None, rebuild=False):
+    snapshot_dir = snapshot_dir or default_snapshot_dir(csv_path)
+    if not os.path.exists(csv_path):
+        print(f"Error: Dataset file not found at {csv_path}")
+        return None
+    if not rebuild and is_snapshot_fresh(csv_path, snapshot_dir):
+        catalog = load_snapshot(snapshot_dir)
+        if catalog is not None:
+            print(f"Loaded {len(catalog)} products from snapshot {snapshot_dir}")
+            return catalog
+    return build_snapshot(csv_path, snapshot_dir)
+
+
+if __name__ == "__main__":
+    import sys
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else './data/final.csv'
+    if build_snapshot(csv_path) is None:
+        print("Error: Snapshot build failed.")
@@ -0,0 +1,39 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+@pytest.fixture
+def stand_in_server():
+    # Local stand-in for a remote host. respond(handler) answers every GET with
+    # (status, headers, body); each request is logged as (time, Host, path).
+    servers = []
+
+    def start(respond):
+        requests_log = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                requests_log.append((time.monotonic(), self.headers.get('Host'), self.path))
+                status, headers, body = respond(self)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.server_port, requests_log
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import model_image
+from landmark_store import NUM_LANDMARKS, array_to_results
+from model_image import apply_thresholds, check_pose_type, classify_poses
+
+CASES = 5000
+
+
+def _fuzzed_landmarks(rng, n):
+    # Landmarks spread around every threshold: visibilities drawn both at
+    # random and right at VISIBILITY_THRESHOLD, coordinates partly off-image.
+    # float64, so values can equal a threshold exactly (no float32 value does).
+    landmarks = np.empty((n, NUM_LANDMARKS, 4), dtype=np.float64)
+    landmarks[:, :, 0] = rng.uniform(-0.2, 1.2, (n, NUM_LANDMARKS))
+    landmarks[:, :, 1] = rng.uniform(-0.2, 1.2, (n, NUM_LANDMARKS))
+    landmarks[:, :, 2] = rng.normal(0, 0.3, (n, NUM_LANDMARKS))
+    visibility = rng.uniform(0, 1, (n, NUM_LANDMARKS))
+    at_threshold = rng.random((n, NUM_LANDMARKS)) < 0.2
+    visibility[at_threshold] = model_image.VISIBILITY_THRESHOLD + rng.choice([-1e-6, 0, 1e-6], at_threshold.sum())
+    mostly_visible = rng.random(n) < 0.5
+    visibility[mostly_visible] = np.maximum(visibility[mostly_visible], rng.uniform(0.5, 1, (mostly_visible.sum(), 1)))
+    landmarks[:, :, 3] = visibility
+    return landmarks
+
+
+def _scalar(landmarks, heights, detected):
+    return [check_pose_type(array_to_results(points if found else None), (int(height), 400, 3))
+            for points, height, found in zip(landmarks, heights, detected)]
+
+
+@pytest.mark.parametrize('overrides', [{}, {'VISIBILITY_THRESHOLD': '0.3', 'VERTICAL_SPREAD_THRESHOLD': '0.4'},
+                                       {'MAX_Y_DIFF_RATIO_SHOULDERS': '0.5', 'MAX_Z_DIFF_HIPS': '0.9'}])
+def test_classify_poses_matches_check_pose_type(overrides):
+    defaults = {name: getattr(model_image, name) for name in overrides}
+    apply_thresholds(overrides)
+    try:
+        rng = np.random.default_rng(17)
+        landmarks = _fuzzed_landmarks(rng, CASES)
+        heights = rng.integers(1, 2000, CASES)
+        detected = rng.random(CASES) > 0.05
+
+        pose_types, fronts = classify_poses(landmarks, heights, detected)
+
+        expected = _scalar(landmarks, heights, detected)
+        assert [(str(t), bool(f)) for t, f in zip(pose_types, fronts)] == expected
+        assert {t for t, _ in expected} >= {'Full', 'Upper', 'None'}
+        assert any(f for _, f in expected)
+    finally:
+        apply_thresholds(defaults)
@@ -0,0 +1,108 @@
+import re
+
+import cv2
+import numpy as np
+
+from image_cache import ImageCache
+from image_fetch import ImageFetcher
+
+ORIGINAL_PATH = '/h_720,q_90,w_540/v1/assets/images/1/model.jpg'
+RENDITION_PATH = '/h_171,q_70,w_128/v1/assets/images/1/model.jpg'
+
+
+def _image_server(stand_in_server):
+    # Serves a blank JPEG sized by the path's h_/w_ segment. Renditions (any
+    # width other than the original 540) only exist for Host values added to
+    # the returned set; other hosts answer them with 404.
+    rendition_hosts = set()
+
+    def respond(handler):
+        height, width = (int(v) for v in re.search(r'/h_(\d+),q_\d+,w_(\d+)/', handler.path).groups())
+        if width != 540 and handler.headers.get('Host') not in rendition_hosts:
+            return 404, {}, b''
+        _, encoded = cv2.imencode('.jpg', np.zeros((height, width, 3), np.uint8))
+        return 200, {'Content-Type': 'image/jpeg'}, encoded.tobytes()
+
+    port, log = stand_in_server(respond)
+    return port, log, rendition_hosts
+
+
+def _fetcher(*hosts, host_failures=2):
+    return ImageFetcher(rendition_width=128, rendition_hosts=hosts, max_retries=0,
+                        rendition_host_failures=host_failures)
+
+
+def _original(host, n=1):
+    return f'http://{host}{ORIGINAL_PATH}'.replace('/images/1/', f'/images/{n}/')
+
+
+def _requests(log):
+    requests = [(host, path) for _, host, path in log]
+    log.clear()
+    return requests
+
+
+def test_rendition_is_fetched_when_the_host_serves_it(stand_in_server):
+    port, log, rendition_hosts = _image_server(stand_in_server)
+    host = f'127.0.0.1:{port}'
+    rendition_hosts.add(host)
+
+    image = _fetcher(host).fetch_image(_original(host))
+
+    assert image.shape[:2] == (171, 128)
+    assert [path for _, _, path in log] == [RENDITION_PATH]
+
+
+def test_failed_rendition_falls_back_for_that_image_only(stand_in_server):
+    port, log, rendition_hosts = _image_server(stand_in_server)
+    host = f'127.0.0.1:{port}'
+    fetcher = _fetcher(host)
+
+    assert fetcher.fetch_image(_original(host)).shape[:2] == (720, 540)
+    assert _requests(log) == [(host, RENDITION_PATH), (host, ORIGINAL_PATH)]
+
+    # The next image on the same host still gets its rendition.
+    rendition_hosts.add(host)
+    assert fetcher.fetch_image(_original(host, 2)).shape[:2] == (171, 128)
+    assert _requests(log) == [(host, RENDITION_PATH.replace('/1/', '/2/'))]
+
+
+def test_host_is_skipped_after_consecutive_failures_only(stand_in_server):
+    port, log, rendition_hosts = _image_server(stand_in_server)
+    host = f'127.0.0.1:{port}'
+    fetcher = _fetcher(host, host_failures=2)
+
+    # A success between two failures resets the count.
+    fetcher.fetch_image(_original(host, 1))
+    rendition_hosts.add(host)
+    fetcher.fetch_image(_original(host, 2))
+    rendition_hosts.discard(host)
+    fetcher.fetch_image(_original(host, 3))
+    _requests(log)
+    fetcher.fetch_image(_original(host, 4))
+    assert _requests(log)[0] == (host, RENDITION_PATH.replace('/1/', '/4/'))
+
+    # Two failures in a row: originals only from now on.
+    fetcher.fetch_image(_original(host, 5))
+    assert _requests(log) == [(host, ORIGINAL_PATH.replace('/1/', '/5/'))]
+
+
+def test_undecodable_cache_entry_is_dropped_and_refetched(stand_in_server, tmp_path):
+    port, log, _ = _image_server(stand_in_server)
+    url = _original(f'127.0.0.1:{port}')
+    cache = ImageCache(str(tmp_path))
+    cache.put(url, b'<html>403 Forbidden</html>')
+    fetcher = ImageFetcher(cache=cache, max_retries=0)
+
+    assert fetcher.fetch_image(url).shape[:2] == (720, 540)
+    assert fetcher.fetch_image(url).shape[:2] == (720, 540)
+    assert [path for _, _, path in log] == [ORIGINAL_PATH]
+
+
+def test_undecodable_download_is_not_cached(stand_in_server, tmp_path):
+    port, log = stand_in_server(lambda handler: (200, {'Content-Type': 'text/html'}, b'<html>blocked</html>'))
+    url = _original(f'127.0.0.1:{port}')
+    cache = ImageCache(str(tmp_path))
+
+    assert ImageFetcher(cache=cache, max_retries=0).fetch_image(url) is None
+    assert cache.get(url) is None
@@ -0,0 +1,86 @@
+import json
+import math
+import os
+
+import numpy as np
+
+from landmark_store import NUM_LANDMARKS, LandmarkStore
+from snapshot import PackedStrings
+
+
+def _points(value):
+    return np.full((NUM_LANDMARKS, 4), value, dtype=np.float32)
+
+
+def _npy_files(store_dir):
+    return {name for name in os.listdir(store_dir) if name.endswith('.npy')}
+
+
+def test_saves_append_segments_and_keep_their_count_logarithmic(tmp_path):
+    store_dir = str(tmp_path)
+    store = LandmarkStore(store_dir)
+    written = set()
+    for chunk in range(40):
+        for i in range(5):
+            store.put(f'u{chunk}-{i}', _points(chunk) if i else None, (100, 80))
+        assert store.save() == 5
+        new_files = _npy_files(store_dir) - written
+        # Only the new rows, or a merge of the newest segments, are written;
+        # no file name is ever reused.
+        assert not new_files & written
+        written |= new_files
+        assert len(store.segments) <= math.log2(chunk + 1) + 1
+
+    reloaded = LandmarkStore(store_dir)
+    assert len(reloaded) == 200
+    assert reloaded.get('u39-0') == (None, (100, 80, 3))
+    assert np.array_equal(reloaded.get('u7-3')[0], _points(7))
+
+
+def test_newest_row_wins_across_segments(tmp_path):
+    store = LandmarkStore(str(tmp_path))
+    for i in range(8):
+        store.put(f'u{i}', _points(1), (10, 10))
+    store.save()
+    store.put('u3', _points(2), (20, 20))
+    store.save()
+
+    reloaded = LandmarkStore(str(tmp_path))
+    assert len(reloaded) == 8
+    assert reloaded.get('u3')[1] == (20, 20, 3)
+    merged = reloaded.merged()
+    assert sorted(merged['urls']) == sorted(f'u{i}' for i in range(8))
+    assert merged['shapes'][merged['urls'].index('u3')].tolist() == [20, 20, 3]
+
+
+def test_store_from_before_segments_is_read_and_extended(tmp_path):
+    # Layout written by the single-generation store: one set of files and a
+    # meta.json naming its generation.
+    packed = PackedStrings.from_values(['old'])
+    for name, array in (('landmarks', _points(5)[None]), ('shapes', np.array([[30, 40, 3]], dtype=np.int32)),
+                        ('detected', np.array([True])), ('urls.data', packed.data), ('urls.offsets', packed.offsets)):
+        np.save(tmp_path / f'{name}.4.npy', array)
+    (tmp_path / 'meta.json').write_text(json.dumps({'version': 1, 'generation': 4, 'rows': 1}))
+
+    store = LandmarkStore(str(tmp_path))
+    assert np.array_equal(store.get('old')[0], _points(5))
+    store.put('new', None, (1, 2))
+    store.save()
+
+    reloaded = LandmarkStore(str(tmp_path))
+    assert len(reloaded) == 2
+    assert np.array_equal(reloaded.get('old')[0], _points(5))
+    assert reloaded.get('new') == (None, (1, 2, 3))
+
+
+def test_refresh_picks_up_segments_saved_by_another_store(tmp_path):
+    writer = LandmarkStore(str(tmp_path))
+    reader = LandmarkStore(str(tmp_path))
+    writer.put('a', _points(1), (10, 10))
+    writer.save()
+    assert 'a' not in reader
+
+    reader.put('b', None, (5, 5))
+    reader.refresh()
+    assert np.array_equal(reader.get('a')[0], _points(1))
+    assert reader.get('b') == (None, (5, 5, 3))
@@ -0,0 +1,56 @@
+import os
+
+from cache_store import EVICTION_SLACK
+from page_cache import PageCache
+
+HEADERS = {'ETag': '"v1"', 'Content-Type': 'text/html'}
+# Non-ASCII text: the stored metadata is several times longer than the string.
+SEARCH_TEXT = 'महिलाओं के लिए कुर्ता ' * 20
+
+
+def _url(i):
+    return f'https://www.example.com/kurtas/{i}'
+
+
+def _disk_bytes(root):
+    return sum(os.path.getsize(os.path.join(d, name)) for d, _, names in os.walk(root) for name in names)
+
+
+def test_disk_stays_under_the_cap_with_multibyte_metadata(tmp_path):
+    max_bytes = 8000
+    cache = PageCache(str(tmp_path), max_bytes=max_bytes)
+    for i in range(40):
+        cache.put(_url(i), b'<html>kurta</html>', HEADERS, SEARCH_TEXT, 1)
+        assert _disk_bytes(tmp_path) <= max_bytes * (1 + EVICTION_SLACK)
+
+    assert cache.get(_url(0)) is None
+    assert cache.get(_url(39))['search_text'] == SEARCH_TEXT
+
+
+def test_revalidating_entries_keeps_the_disk_under_the_cap(tmp_path):
+    max_bytes = 8000
+    cache = PageCache(str(tmp_path), max_bytes=max_bytes)
+    for i in range(5):
+        cache.put(_url(i), b'<html>kurta</html>', HEADERS, 'short', 1)
+    # Each refresh/update grows the metadata; the growth is counted too.
+    for i in range(5):
+        cache.update_search_text(_url(i), cache.get(_url(i)), SEARCH_TEXT, 2)
+        cache.refresh(_url(i), cache.get(_url(i)))
+    for i in range(5, 40):
+        cache.put(_url(i), b'<html>kurta</html>', HEADERS, SEARCH_TEXT, 2)
+        assert _disk_bytes(tmp_path) <= max_bytes * (1 + EVICTION_SLACK)
+
+
+def test_search_text_is_re_extracted_from_the_stored_body(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.put(_url(1), b'<html>men</html>', HEADERS, 'old text', 1)
+
+    meta = cache.get(_url(1))
+    assert cache.get_body(_url(1)) == b'<html>men</html>'
+    cache.update_search_text(_url(1), meta, 'new text', 2)
+
+    reopened = PageCache(str(tmp_path))
+    assert reopened.get(_url(1))['search_text'] == 'new text'
+    assert reopened.get(_url(1))['text_version'] == 2
+    assert reopened.get(_url(1))['fetched_at'] == meta['fetched_at']
+    assert reopened.get_body(_url(1)) == b'<html>men</html>'
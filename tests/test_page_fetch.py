@@ -0,0 +1,40 @@
+from page_fetch import PageFetcher
+
+
+def _page(handler):
+    return 200, {'Content-Type': 'text/html'}, b'<html><title>Women Kurta</title></html>'
+
+
+def test_token_bucket_spaces_requests_to_one_host(stand_in_server):
+    port, log = stand_in_server(_page)
+    fetcher = PageFetcher(rate_per_host=10, burst=1, max_workers=4, backoff_base=0.01)
+    try:
+        urls = [f'http://127.0.0.1:{port}/p{i}' for i in range(6)]
+        statuses = [response.status_code for response in fetcher.map(fetcher.fetch, urls)]
+    finally:
+        fetcher.close()
+
+    assert statuses == [200] * 6
+    times = sorted(t for t, _, _ in log)
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    # 10 requests/s with no burst: starts at least ~0.1s apart even with 4 in flight.
+    assert min(gaps) > 0.08
+    assert times[-1] - times[0] > 0.45
+
+
+def test_retry_after_sets_the_backoff(stand_in_server):
+    seen = []
+
+    def respond(handler):
+        seen.append(handler.path)
+        if len(seen) == 1:
+            return 429, {'Retry-After': '1'}, b''
+        return _page(handler)
+
+    port, log = stand_in_server(respond)
+    fetcher = PageFetcher(rate_per_host=100, burst=5, backoff_base=0.01)
+    response = fetcher.fetch(f'http://127.0.0.1:{port}/limited')
+
+    assert response.status_code == 200
+    assert len(log) == 2
+    assert log[1][0] - log[0][0] >= 0.95
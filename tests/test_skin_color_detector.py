@@ -0,0 +1,27 @@
+import cv2
+import numpy as np
+
+from skin_color_detector import skin_color_from_image
+
+SKIN_HSV = (12, 100, 200)
+
+
+def _image_with_skin_patch(height, width, side):
+    hsv = np.zeros((height, width, 3), np.uint8)
+    hsv[:side, :side] = SKIN_HSV
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+
+def test_rendition_threshold_scales_with_its_area():
+    # 400 skin pixels: too few for a full-size 540 x 720 image, plenty for its
+    # 128 px wide rendition once the threshold is scaled down.
+    rendition = _image_with_skin_patch(171, 128, 20)
+
+    assert skin_color_from_image(rendition) is None
+    assert skin_color_from_image(rendition, original_shape=(720, 540)) is not None
+
+
+def test_full_size_image_keeps_the_full_threshold():
+    image = _image_with_skin_patch(720, 540, 20)
+
+    assert skin_color_from_image(image, original_shape=(720, 540)) is None
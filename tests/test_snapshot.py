@@ -0,0 +1,28 @@
+import os
+
+import numpy as np
+
+from benchmark import generate_catalog, seed_profile
+from snapshot import default_snapshot_dir, load_catalog
+
+
+def _npy_files(directory):
+    return {os.path.join(root, name) for root, _, names in os.walk(directory) for name in names
+            if name.endswith('.npy')}
+
+
+def test_rebuild_never_writes_over_mapped_files(tmp_path):
+    csv_path = str(tmp_path / 'final.csv')
+    generate_catalog(csv_path, 200, seed_profile())
+    load_catalog(csv_path)
+    mapped = load_catalog(csv_path)
+    colors = np.array(mapped.colors)
+    files = _npy_files(default_snapshot_dir(csv_path))
+
+    rebuilt = load_catalog(csv_path, rebuild=True)
+
+    # The rebuild went to new paths; the files the first catalog maps were
+    # not rewritten in place.
+    assert not _npy_files(default_snapshot_dir(csv_path)) & files
+    assert np.array_equal(np.array(mapped.colors), colors)
+    assert np.array_equal(np.array(load_catalog(csv_path).colors), np.array(rebuilt.colors))